@@ -2,6 +2,12 @@ from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
 from .database import db, init_app, create_database
 from .routes.register_routes import register_routes
+from .commands import register_commands
+from .metrics import init_metrics
+from .compression import init_compression
+from .assets import init_assets
+from .json_provider import json_provider_class
+from . import slow_queries  # registers the slow-query engine hooks
 from config import SQLALCHEMY_DATABASE_URI, SQLALCHEMY_TRACK_MODIFICATIONS, SQLALCHEMY_DATABASE_PATH
 import os
 
@@ -10,19 +16,24 @@ TODO:
 - Add ability to drag and drop .csv file and upload data to backend
 - Add overview of all company stats when no company is selected
 - Add ability, (input box pop up) for 'add company' button
-- implement caching 
 """
 
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__)
-    CORS(app)  # Enable CORS for API endpoints
+    app.json = json_provider_class()(app)  # orjson when available (app/json_provider.py)
+    CORS(app, expose_headers=['ETag'])  # Enable CORS for API endpoints
 
     # Database configuration
     basedir = os.path.abspath(os.path.dirname(__file__))
     app.config['SQLALCHEMY_DATABASE_URI'] = SQLALCHEMY_DATABASE_URI 
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = SQLALCHEMY_TRACK_MODIFICATIONS
+    if config_overrides:
+        app.config.update(config_overrides)  # e.g. a different database for benchmarks
     
-    db.init_app(app)
+    init_app(app)  # engines, read/write pools and SQLite PRAGMAs (app/database.py)
+    init_metrics(app)
+    init_compression(app)  # after_request hooks run in reverse, so metrics see the compressed response
+    init_assets(app)  # asset_urls() template helper and fingerprinted static files
 
     # Frontend route
     @app.route('/')
@@ -48,6 +59,7 @@ def create_app():
         return jsonify({'error': 'Internal server error'}), 500
 
     register_routes(app)
+    register_commands(app)
     return app
 
 
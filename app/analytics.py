@@ -0,0 +1,168 @@
+"""
+In-memory columnar snapshot of data_entries for the /stats endpoints.
+
+With ANALYTICS_ENGINE = 'numpy' the stats endpoints aggregate NumPy arrays instead
+of querying SQLite. The arrays hold company_id, the device_type and data_set
+dictionary ids (0 for NULL) and created_at as int64 epoch seconds. Counts come
+from np.bincount over the integer codes: one company x value count matrix per
+dimension is built after each refresh, so a stats request only slices that
+matrix and never reads data_entries.
+
+Each request first compares the table_versions markers with the ones the
+snapshot was built at. If rows were only inserted since then, the rows past the
+id watermark are appended. If an UPDATE or DELETE touched data_entries (the
+data_entries_rewrites marker moved), the snapshot is reloaded from scratch.
+Every web worker process keeps its own snapshot.
+"""
+import threading
+import time
+
+import numpy as np
+from app.database import db
+from app.dictionary import lookup_value
+from app.versions import TRACKED_TABLES, get_table_versions, rewrite_marker
+from config import ANALYTICS_ENGINE, ANALYTICS_LOAD_BATCH_SIZE
+
+# name -> (SQL expression, dtype)
+SNAPSHOT_COLUMNS = {
+    'company_id': ('company_id', np.int32),
+    'device_type': ('COALESCE(device_type_id, 0)', np.int32),
+    'data_set': ('COALESCE(data_set_id, 0)', np.int32),
+    'created_at': ("COALESCE(CAST(strftime('%s', created_at) AS INTEGER), 0)", np.int64),
+}
+
+_REWRITES = rewrite_marker('data_entries')
+_LOAD_SQL = 'SELECT id, {} FROM data_entries WHERE id > ? ORDER BY id'.format(
+    ', '.join(expression for expression, _ in SNAPSHOT_COLUMNS.values())
+)
+
+
+def analytics_enabled():
+    return ANALYTICS_ENGINE == 'numpy'
+
+
+def _empty_columns():
+    return {name: np.empty(0, dtype=dtype) for name, (_, dtype) in SNAPSHOT_COLUMNS.items()}
+
+
+class ColumnarSnapshot:
+    def __init__(self):
+        self.columns = _empty_columns()
+        self.watermark = 0
+        self.versions = None
+        self.full_loads = 0
+        self.incremental_loads = 0
+        self.last_load_seconds = None
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def _read_rows(self, after_id):
+        """Column arrays for the rows with id > after_id, and the highest id read"""
+        parts = {name: [] for name in SNAPSHOT_COLUMNS}
+        last_id = after_id
+        # Plain DBAPI tuples convert to an ndarray far faster than SQLAlchemy Row objects
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.execute(_LOAD_SQL, (after_id,))
+            blocks = iter(lambda: cursor.fetchmany(ANALYTICS_LOAD_BATCH_SIZE), [])
+            for rows in blocks:
+                block = np.array(rows, dtype=np.int64)
+                last_id = int(block[-1, 0])
+                for position, (name, (_, dtype)) in enumerate(SNAPSHOT_COLUMNS.items(), start=1):
+                    parts[name].append(block[:, position].astype(dtype))
+        finally:
+            cursor.close()
+        columns = {
+            name: np.concatenate(chunks) if chunks else np.empty(0, dtype=SNAPSHOT_COLUMNS[name][1])
+            for name, chunks in parts.items()
+        }
+        return columns, last_id
+
+    def refresh(self):
+        """Bring the snapshot up to date with the database"""
+        versions = get_table_versions(TRACKED_TABLES + [_REWRITES])
+        if versions == self.versions:
+            return
+        with self._lock:
+            if versions == self.versions:
+                return
+            started = time.perf_counter()
+            rewritten = (self.versions is None or _REWRITES not in versions
+                         or versions[_REWRITES] != self.versions.get(_REWRITES))
+            if rewritten:
+                columns, watermark = self._read_rows(0)
+                self.full_loads += 1
+            else:
+                new_columns, watermark = self._read_rows(self.watermark)
+                columns = {name: np.concatenate([self.columns[name], new_columns[name]])
+                           for name in SNAPSHOT_COLUMNS}
+                self.incremental_loads += 1
+            # Readers take a reference to the whole dict, so swap it in one assignment
+            self.columns = columns
+            self.watermark = watermark
+            self.versions = versions
+            self.last_load_seconds = round(time.perf_counter() - started, 4)
+
+    def _matrix(self, dimension):
+        """company_id x value id count matrix, built with one bincount per refresh"""
+        columns = self.columns
+        cached = self._matrices.get(dimension)
+        if cached is not None and cached[0] is columns:
+            return cached[1]
+        companies = columns['company_id'].astype(np.int64)
+        codes = columns[dimension]
+        width = int(codes.max()) + 1 if len(codes) else 1
+        height = int(companies.max()) + 1 if len(companies) else 1
+        matrix = np.bincount(companies * width + codes, minlength=width * height).reshape(height, width)
+        self._matrices[dimension] = (columns, matrix)
+        return matrix
+
+    def company_counts(self, dimension, company_ids=None):
+        """[(company_id, value id, count)] for every non-empty (company, value) group"""
+        matrix = self._matrix(dimension)
+        if company_ids is None:
+            company_ids = np.arange(len(matrix))
+        else:
+            company_ids = np.array([company_id for company_id in company_ids
+                                    if 0 <= company_id < len(matrix)], dtype=np.int64)
+        rows, codes = np.nonzero(matrix[company_ids])
+        return list(zip(company_ids[rows].tolist(), codes.tolist(),
+                        matrix[company_ids[rows], codes].tolist()))
+
+    def totals(self, dimension):
+        """[(value id, count)] over all companies"""
+        counts = self._matrix(dimension).sum(axis=0)
+        keys = np.flatnonzero(counts)
+        return list(zip(keys.tolist(), counts[keys].tolist()))
+
+    def company_totals(self):
+        """{company_id: entry count}"""
+        counts = self._matrix('data_set').sum(axis=1)
+        keys = np.flatnonzero(counts)
+        return dict(zip(keys.tolist(), counts[keys].tolist()))
+
+    def stats(self):
+        columns = self.columns
+        return {
+            'engine': ANALYTICS_ENGINE,
+            'rows': int(len(columns['company_id'])),
+            'memory_bytes': int(sum(array.nbytes for array in columns.values())),
+            'aggregate_bytes': int(sum(matrix.nbytes for _, matrix in self._matrices.values())),
+            'watermark': self.watermark,
+            'full_loads': self.full_loads,
+            'incremental_loads': self.incremental_loads,
+            'last_load_seconds': self.last_load_seconds,
+        }
+
+
+snapshot = ColumnarSnapshot()
+
+
+def decode(dimension, value_id):
+    """Dictionary id from the snapshot -> value name (0 means NULL)"""
+    return lookup_value(dimension, value_id) if value_id else None
+
+
+def by_value_name(rows, position=0):
+    """Order rows the way SQL's ORDER BY value does: NULL first, then by name"""
+    return sorted(rows, key=lambda row: (row[position] is not None, row[position] or ''))
@@ -0,0 +1,373 @@
+"""
+Static asset pipeline: bundle, minify, fingerprint and precompress.
+
+`flask --app app build-assets` runs offline, in plain Python with no Node
+toolchain. It does the following:
+- bundles the ES modules under static/js into one script, each module wrapped
+  in its own function scope with its imports resolved
+- minifies the script and the stylesheet, stripping comments and whitespace
+  outside of string, template and regex literals
+- writes them as static/dist/<name>.<content hash>.<ext>, each with a .gz
+  sibling, plus static/dist/manifest.json mapping logical names to the output
+
+Outputs of earlier builds are kept. Workers started before the build, and HTML
+already in browsers, proxies or the page cache, still reference them, and a
+fingerprinted URL must not stop working. `build-assets --prune` deletes the
+ones the current manifest does not use once they are older than
+STATIC_ASSET_RETENTION.
+
+Templates ask asset_urls('js/app.js') for their script and stylesheet URLs.
+Once a manifest exists that is the fingerprinted bundle. Without one (a
+development checkout) it is the unbundled source files, so editing them needs
+no build. Fingerprinted files never change under their name, so they are
+served with a one-year `immutable` Cache-Control, and from the .gz sibling
+when the client accepts gzip.
+
+Bundled modules may only use named imports/exports of other bundled modules
+(`import { a, b } from './x.js'`). Imported bindings are copied when the
+importing module runs, so a module must not reassign a `let` it exports.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import time
+
+from flask import current_app, request, send_from_directory, url_for
+from config import STATIC_ASSET_RETENTION, STATIC_HASHED_MAX_AGE
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# Logical asset -> source files (relative to the static folder). A JS bundle lists
+# its entry modules; the modules they import are pulled in automatically.
+BUNDLES = {
+    'js/app.js': ['js/main.js', 'js/companies.js', 'js/data_entries.js', 'js/statistics.js'],
+    'css/style.css': ['css/style.css'],
+}
+
+_IMPORT = re.compile(r"^\s*import\s*\{([^}]*)\}\s*from\s*['\"](\./[^'\"]+)['\"]\s*;?[ \t]*$", re.M)
+_EXPORT_LIST = re.compile(r'^\s*export\s*\{([^}]*)\}\s*;?', re.M)
+_EXPORT_DECLARATION = re.compile(r'^(\s*)export\s+((?:async\s+)?function\*?|class|let|const|var)\s+([\w$]+)', re.M)
+
+_KEYWORDS_BEFORE_REGEX = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                          'void', 'throw', 'instanceof', 'yield', 'await'}
+
+
+# Minification
+
+def _is_word(char):
+    return char.isalnum() or char in '_$' or ord(char) > 127
+
+
+def _read_quoted(source, start, quote):
+    i = start + 1
+    while i < len(source) and source[i] != quote:
+        i += 2 if source[i] == '\\' else 1
+    return i + 1
+
+
+def _read_regex(source, start):
+    i, in_class = start + 1, False
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '\n':
+            raise ValueError(f'unterminated regex literal at offset {start}')
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            i += 1
+            while i < len(source) and source[i].isalpha():
+                i += 1
+            return i
+        i += 1
+    raise ValueError(f'unterminated regex literal at offset {start}')
+
+
+def _read_template(source, start):
+    """End of the template text from `start`, and whether it stopped at a ${ substitution"""
+    i = start
+    while i < len(source):
+        if source[i] == '\\':
+            i += 2
+        elif source[i] == '`':
+            return i + 1, False
+        elif source.startswith('${', i):
+            return i + 2, True
+        else:
+            i += 1
+    raise ValueError(f'unterminated template literal at offset {start}')
+
+
+def _js_separator(last, next_char, whitespace):
+    """What, if anything, must stay between two tokens that had whitespace between them"""
+    if whitespace == '\n':
+        # Newlines can end statements (ASI); only drop them where they cannot
+        if last in '{([;,' or next_char in ')]};,.':
+            return ''
+        return '\n'
+    if (_is_word(last) and _is_word(next_char)) or (last in '+-' and next_char in '+-'):
+        return ' '
+    return ''
+
+
+def minify_js(source):
+    out = []
+    last = ''
+    pending = None      # whitespace seen since the last token: None, ' ' or '\n'
+    templates = []      # open `{` count inside each enclosing ${ } substitution
+    i, length = 0, len(source)
+    while i < length:
+        char = source[i]
+        if char in ' \t\r\n':
+            end = i
+            while end < length and source[end] in ' \t\r\n':
+                end += 1
+            pending = '\n' if pending == '\n' or '\n' in source[i:end] else ' '
+            i = end
+            continue
+        if source.startswith('//', i):
+            end = source.find('\n', i)
+            i = length if end < 0 else end
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            if end < 0:
+                raise ValueError(f'unterminated comment at offset {i}')
+            if '\n' in source[i:end]:
+                pending = '\n'
+            elif pending is None:
+                pending = ' '
+            i = end + 2
+            continue
+
+        if pending and last:
+            out.append(_js_separator(last, char, pending))
+        pending = None
+
+        if char in '"\'':
+            end = _read_quoted(source, i, char)
+        elif char == '`':
+            end, substitution = _read_template(source, i + 1)
+            if substitution:
+                templates.append(0)
+        elif char == '}' and templates and templates[-1] == 0:
+            templates.pop()
+            end, substitution = _read_template(source, i + 1)
+            if substitution:
+                templates.append(0)
+        elif char == '/':
+            tail = ''.join(out[-3:])
+            word = re.search(r'[\w$]+$', tail)
+            if not last or last in '(,=:[!&|?{};+-*%<>~^' or (word and word.group() in _KEYWORDS_BEFORE_REGEX):
+                end = _read_regex(source, i)
+            else:
+                end = i + 1
+        else:
+            if char == '{' and templates:
+                templates[-1] += 1
+            elif char == '}' and templates:
+                templates[-1] -= 1
+            end = i + 1
+            while _is_word(char) and end < length and _is_word(source[end]):
+                end += 1
+
+        out.append(source[i:end])
+        last = source[end - 1]
+        i = end
+    return ''.join(out).strip() + '\n'
+
+
+def _minify_css_code(code):
+    code = re.sub(r'\s+', ' ', code)
+    code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+    code = re.sub(r':\s+', ':', code)
+    return code.replace(';}', '}')
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    # Odd items are string literals, left as they are
+    parts = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', source)
+    return ''.join(part if index % 2 else _minify_css_code(part) for index, part in enumerate(parts)).strip() + '\n'
+
+
+# Bundling
+
+def _module_order(static_folder, entries):
+    """Entry modules and everything they import, dependencies first"""
+    order, visiting = [], set()
+
+    def visit(path):
+        if path in order:
+            return
+        if path in visiting:
+            raise ValueError(f'circular import involving {path}')
+        visiting.add(path)
+        with open(os.path.join(static_folder, path), encoding='utf-8') as f:
+            source = f.read()
+        for _, target in _IMPORT.findall(source):
+            visit(os.path.normpath(os.path.join(os.path.dirname(path), target)).replace(os.sep, '/'))
+        visiting.discard(path)
+        order.append(path)
+
+    for entry in entries:
+        visit(entry)
+    return order
+
+
+def _names(clause):
+    """'a, b as c' -> [('a', 'b'), ('b', 'c')] as (local, exported) pairs"""
+    pairs = []
+    for item in clause.split(','):
+        parts = item.split()
+        if parts:
+            pairs.append((parts[0], parts[-1]))
+    return pairs
+
+
+def _wrap_module(path, source, variables):
+    """A module as `const <var> = (() => {...; return {exports}})();` with its imports resolved"""
+    exports = []
+
+    def resolve_import(match):
+        target = os.path.normpath(os.path.join(os.path.dirname(path), match.group(2))).replace(os.sep, '/')
+        bindings = ', '.join(name if name == local else f'{name}: {local}'
+                             for name, local in _names(match.group(1)))
+        return f'const {{ {bindings} }} = {variables[target]};'
+
+    def collect_list(match):
+        exports.extend(_names(match.group(1)))
+        return ''
+
+    def collect_declaration(match):
+        exports.append((match.group(3), match.group(3)))
+        return f'{match.group(1)}{match.group(2)} {match.group(3)}'
+
+    source = _IMPORT.sub(resolve_import, source)
+    source = _EXPORT_LIST.sub(collect_list, source)
+    source = _EXPORT_DECLARATION.sub(collect_declaration, source)
+    if re.search(r'^\s*(import|export)\b', source, re.M):
+        raise ValueError(f'{path}: only named imports and exports of bundled modules are supported')
+    returned = ', '.join(local if local == name else f'{name}: {local}' for local, name in exports)
+    return f'// {path}\nconst {variables[path]} = (() => {{\n{source}\nreturn {{ {returned} }};\n}})();\n'
+
+
+def bundle_js(static_folder, entries):
+    order = _module_order(static_folder, entries)
+    variables = {path: f'__module_{index}' for index, path in enumerate(order)}
+    parts = []
+    for path in order:
+        with open(os.path.join(static_folder, path), encoding='utf-8') as f:
+            parts.append(_wrap_module(path, f.read(), variables))
+    return ''.join(parts)
+
+
+def build_assets(static_folder, log=print):
+    """Write the fingerprinted bundles, their .gz siblings and the manifest; returns the manifest"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        if name.endswith('.js'):
+            content = minify_js(bundle_js(static_folder, sources))
+        else:
+            content = ''
+            for source in sources:
+                with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                    content += f.read() + '\n'
+            content = minify_css(content)
+
+        data = content.encode('utf-8')
+        stem, extension = os.path.splitext(os.path.basename(name))
+        filename = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+        with open(os.path.join(dist, filename), 'wb') as f:
+            f.write(data)
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        with open(os.path.join(dist, filename + '.gz'), 'wb') as f:
+            f.write(compressed)
+        manifest[name] = f'{DIST_DIR}/{filename}'
+        log(f'{name} -> {DIST_DIR}/{filename} ({len(data)} bytes, {len(compressed)} gzipped)')
+
+    # Replace the manifest atomically, so a worker starting now never reads half of it
+    temporary = os.path.join(dist, MANIFEST + '.tmp')
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temporary, os.path.join(dist, MANIFEST))
+    return manifest
+
+
+def prune_assets(static_folder, max_age=STATIC_ASSET_RETENTION, log=print):
+    """Delete built files the current manifest does not use and that are older than max_age seconds"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    with open(os.path.join(dist, MANIFEST), encoding='utf-8') as f:
+        current = {os.path.basename(path) for path in json.load(f).values()}
+    cutoff = time.time() - max_age
+    removed = 0
+    for filename in os.listdir(dist):
+        path = os.path.join(dist, filename)
+        if filename == MANIFEST or filename.removesuffix('.gz') in current or os.path.getmtime(path) > cutoff:
+            continue
+        os.remove(path)
+        removed += 1
+        log(f'Removed {DIST_DIR}/{filename}')
+    return removed
+
+
+# Serving
+
+_manifest_cache = {}
+
+
+def load_manifest(static_folder):
+    """The build manifest, read once per process ({} when assets were never built)"""
+    if static_folder not in _manifest_cache:
+        try:
+            with open(os.path.join(static_folder, DIST_DIR, MANIFEST), encoding='utf-8') as f:
+                _manifest_cache[static_folder] = json.load(f)
+        except FileNotFoundError:
+            _manifest_cache[static_folder] = {}
+    return _manifest_cache[static_folder]
+
+
+def asset_version():
+    """Hashable id of the asset build pages are rendered against, for cache keys"""
+    return tuple(sorted(load_manifest(current_app.static_folder).items()))
+
+
+def asset_urls(name):
+    """URLs to include for a logical asset: its built file, or its source files when unbuilt"""
+    built = load_manifest(current_app.static_folder).get(name)
+    if built:
+        return [url_for('static', filename=built)]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+
+def serve_static(filename):
+    """Flask's static view, plus immutable caching and precompressed copies for fingerprinted files"""
+    static_folder = current_app.static_folder
+    if not filename.startswith(f'{DIST_DIR}/') or filename.endswith(MANIFEST):
+        return current_app.send_static_file(filename)
+
+    if request.accept_encodings['gzip'] > 0 and os.path.isfile(os.path.join(static_folder, filename + '.gz')):
+        response = send_from_directory(static_folder, filename + '.gz', max_age=STATIC_HASHED_MAX_AGE,
+                                       mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_from_directory(static_folder, filename, max_age=STATIC_HASHED_MAX_AGE)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    app.jinja_env.globals['asset_urls'] = asset_urls
+    app.view_functions['static'] = serve_static
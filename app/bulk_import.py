@@ -0,0 +1,324 @@
+import time
+from sqlalchemy import delete, insert, select, update
+from app.models.models import Company, DataEntry
+from app.database import db
+from app.dictionary import encode_entries
+from config import BULK_IMPORT_BATCH_SIZE, BULK_LOOKUP_CHUNK_SIZE
+
+ENTRY_FIELDS = ['device_type', 'uid', 'data_type', 'data_set', 'data_going_to']
+
+
+def _chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def resolve_company_ids(names):
+    """Map company names to ids with one IN query per chunk of names"""
+    resolved = {}
+    for chunk in _chunks(set(names), BULK_LOOKUP_CHUNK_SIZE):
+        rows = db.session.execute(
+            select(Company.name, Company.id).where(Company.name.in_(chunk))
+        ).all()
+        resolved.update(rows)
+    return resolved
+
+
+def existing_company_ids(company_ids):
+    """Return the subset of company_ids that exist"""
+    found = set()
+    for chunk in _chunks(set(company_ids), BULK_LOOKUP_CHUNK_SIZE):
+        found.update(db.session.scalars(select(Company.id).where(Company.id.in_(chunk))))
+    return found
+
+
+def existing_uids(uids):
+    """Return the subset of uids already stored in data_entries"""
+    found = set()
+    for chunk in _chunks(set(uids), BULK_LOOKUP_CHUNK_SIZE):
+        found.update(db.session.scalars(select(DataEntry.uid).where(DataEntry.uid.in_(chunk))))
+    return found
+
+
+def _to_int(value):
+    """An id given as an int or a string of digits; None for anything else, so 1.5 or "1.9" are not truncated"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isascii() and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def field_type_error(row, fields):
+    """Message for the first of `fields` in row that holds something other than a string or null"""
+    for field in fields:
+        if row.get(field) is not None and not isinstance(row[field], str):
+            return f'{field} must be a string'
+    return None
+
+
+def validate_new_entries(batch, seen_uids):
+    """
+    Validate a batch of new entries as a set. Returns ([(index, insertable dict)],
+    [(index, error message)]) in batch order; accepted UIDs are added to seen_uids.
+    """
+    names = [row['company'].strip() for row in batch
+             if isinstance(row, dict) and isinstance(row.get('company'), str) and not row.get('company_id')]
+    company_ids_by_name = resolve_company_ids(names)
+
+    errors = []
+    candidates = []
+    for index, row in enumerate(batch):
+        if not isinstance(row, dict):
+            errors.append((index, 'Entry must be an object'))
+            continue
+        # Checked before the set-based lookups, which need hashable strings
+        type_error = field_type_error(row, ['company'] + ENTRY_FIELDS)
+        if type_error:
+            errors.append((index, type_error))
+            continue
+        if 'company' in row and not row.get('company_id'):
+            company_id = company_ids_by_name.get((row['company'] or '').strip())
+            if company_id is None:
+                errors.append((index, f"Company '{row['company']}' not found"))
+                continue
+        else:
+            company_id = row.get('company_id')
+
+        if not company_id:
+            errors.append((index, 'company_id is required'))
+            continue
+        if not row.get('uid'):
+            errors.append((index, 'uid is required'))
+            continue
+        company_id = _to_int(company_id)
+        if company_id is None:
+            errors.append((index, 'company_id must be an integer'))
+            continue
+        candidates.append((index, company_id, row))
+
+    valid_company_ids = existing_company_ids(cid for _, cid, _ in candidates)
+    stored_uids = existing_uids(row['uid'] for _, _, row in candidates)
+
+    valid = []
+    for index, company_id, row in candidates:
+        if company_id not in valid_company_ids:
+            errors.append((index, 'Company not found'))
+            continue
+        uid = row['uid']
+        if uid in stored_uids or uid in seen_uids:
+            errors.append((index, 'UID already exists'))
+            continue
+        seen_uids.add(uid)
+
+        entry = {field: row.get(field) for field in ENTRY_FIELDS}
+        entry['company_id'] = company_id
+        valid.append((index, entry))
+
+    errors.sort(key=lambda error: error[0])
+    return valid, errors
+
+
+def import_batch(batch, seen_uids):
+    """Validate and insert one batch without committing. Returns (imported, error messages)."""
+    valid, errors = validate_new_entries(batch, seen_uids)
+    if valid:
+        db.session.execute(insert(DataEntry), encode_entries([entry for _, entry in valid]))
+    return len(valid), [message for _, message in errors]
+
+
+def bulk_import_rows(rows, batch_size=BULK_IMPORT_BATCH_SIZE):
+    """
+    Import an iterable of row dicts (as produced by csv.DictReader) in a single
+    transaction. Rows are validated and inserted in batches, so each batch costs a
+    handful of set-based lookups plus one executemany INSERT.
+    """
+    started = time.perf_counter()
+    imported = 0
+    processed = 0
+    errors = []
+    seen_uids = set()
+
+    try:
+        for batch in batches(rows, batch_size):
+            processed += len(batch)
+            batch_imported, batch_errors = import_batch(batch, seen_uids)
+            imported += batch_imported
+            errors.extend(batch_errors)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    elapsed = time.perf_counter() - started
+    return {
+        'imported': imported,
+        'processed': processed,
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_sec': round(processed / elapsed, 1) if elapsed > 0 else None
+    }
+
+
+# Batch write API (POST/PUT/DELETE /data-entries/batch). These validate a whole batch
+# with set-based lookups and apply it with bulk statements; the caller commits.
+
+def _error_result(index, message):
+    status = 404 if message.endswith('not found') else 400
+    return {'index': index, 'status': status, 'error': message}
+
+
+def _finish(results, applied_count, errors, atomic):
+    """Fill in results for valid items that were held back by an atomic batch"""
+    if atomic and errors:
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {'index': index, 'status': 424,
+                                  'error': 'Not applied: batch contains errors'}
+        applied_count = 0
+    return {
+        'applied': not (atomic and errors),
+        'succeeded': applied_count,
+        'failed': len(errors),
+        'results': results
+    }
+
+
+def batch_create_entries(items, atomic=False):
+    valid, errors = validate_new_entries(items, set())
+    results = [None] * len(items)
+    for index, message in errors:
+        results[index] = _error_result(index, message)
+
+    if valid and not (atomic and errors):
+        new_ids = db.session.scalars(
+            insert(DataEntry).returning(DataEntry.id, sort_by_parameter_order=True),
+            encode_entries([dict(entry) for _, entry in valid])
+        ).all()
+        for (index, entry), entry_id in zip(valid, new_ids):
+            results[index] = {'index': index, 'status': 201, 'id': entry_id, 'uid': entry['uid']}
+
+    return _finish(results, len(valid), errors, atomic)
+
+
+def _entry_uids_by_id(entry_ids):
+    found = {}
+    for chunk in _chunks(set(entry_ids), BULK_LOOKUP_CHUNK_SIZE):
+        found.update(db.session.execute(
+            select(DataEntry.id, DataEntry.uid).where(DataEntry.id.in_(chunk))
+        ).all())
+    return found
+
+
+def _entry_ids_by_uid(uids):
+    found = {}
+    for chunk in _chunks(set(uids), BULK_LOOKUP_CHUNK_SIZE):
+        found.update(db.session.execute(
+            select(DataEntry.uid, DataEntry.id).where(DataEntry.uid.in_(chunk))
+        ).all())
+    return found
+
+
+def _parse_ids(items, key=None):
+    """Pull integer ids out of a batch, recording malformed and duplicate ones as errors"""
+    errors = []
+    parsed = []
+    seen = set()
+    for index, item in enumerate(items):
+        raw = item.get(key) if key and isinstance(item, dict) else (None if key else item)
+        entry_id = raw if isinstance(raw, int) and not isinstance(raw, bool) else None
+        if entry_id is None:
+            errors.append((index, 'id must be an integer'))
+        elif entry_id in seen:
+            errors.append((index, 'Duplicate id in batch'))
+        else:
+            seen.add(entry_id)
+            parsed.append((index, entry_id))
+    return parsed, errors
+
+
+def batch_update_entries(items, atomic=False):
+    parsed, errors = _parse_ids(items, key='id')
+    current_uids = _entry_uids_by_id(entry_id for _, entry_id in parsed)
+
+    candidates = []
+    for index, entry_id in parsed:
+        fields = {field: items[index][field] for field in ENTRY_FIELDS if field in items[index]}
+        type_error = field_type_error(fields, ENTRY_FIELDS)
+        if entry_id not in current_uids:
+            errors.append((index, 'Data entry not found'))
+        elif type_error:
+            errors.append((index, type_error))
+        elif not fields:
+            errors.append((index, 'No data provided'))
+        elif 'uid' in fields and not fields['uid']:
+            errors.append((index, 'uid is required'))
+        else:
+            candidates.append((index, entry_id, fields))
+
+    changed_uids = [fields['uid'] for _, entry_id, fields in candidates
+                    if 'uid' in fields and fields['uid'] != current_uids[entry_id]]
+    owners = _entry_ids_by_uid(changed_uids)
+
+    valid = []
+    claimed_uids = set()
+    for index, entry_id, fields in candidates:
+        uid = fields.get('uid')
+        if uid is not None and uid != current_uids[entry_id]:
+            if uid in claimed_uids or owners.get(uid, entry_id) != entry_id:
+                errors.append((index, 'UID already exists'))
+                continue
+            claimed_uids.add(uid)
+        valid.append((index, {'id': entry_id, **fields}))
+
+    errors.sort(key=lambda error: error[0])
+    results = [None] * len(items)
+    for index, message in errors:
+        results[index] = _error_result(index, message)
+
+    if valid and not (atomic and errors):
+        db.session.execute(update(DataEntry), encode_entries([values for _, values in valid]))
+        for index, values in valid:
+            results[index] = {'index': index, 'status': 200, 'id': values['id']}
+
+    return _finish(results, len(valid), errors, atomic)
+
+
+def batch_delete_entries(entry_ids, atomic=False):
+    parsed, errors = _parse_ids(entry_ids)
+    found = _entry_uids_by_id(entry_id for _, entry_id in parsed)
+
+    valid = []
+    for index, entry_id in parsed:
+        if entry_id in found:
+            valid.append((index, entry_id))
+        else:
+            errors.append((index, 'Data entry not found'))
+
+    errors.sort(key=lambda error: error[0])
+    results = [None] * len(entry_ids)
+    for index, message in errors:
+        results[index] = _error_result(index, message)
+
+    if valid and not (atomic and errors):
+        for chunk in _chunks([entry_id for _, entry_id in valid], BULK_LOOKUP_CHUNK_SIZE):
+            db.session.execute(
+                delete(DataEntry).where(DataEntry.id.in_(chunk)),
+                execution_options={'synchronize_session': False}
+            )
+        for index, entry_id in valid:
+            results[index] = {'index': index, 'status': 200, 'id': entry_id}
+
+    return _finish(results, len(valid), errors, atomic)
@@ -0,0 +1,152 @@
+"""
+In-process response cache for read-heavy JSON endpoints.
+
+Entries are keyed on (data generation, table versions, path, query args). The
+table versions come from the trigger-maintained table_versions rows, so a write
+made by any process (another web worker, an import job, the ingest CLI) changes
+the key and a cached response is never served after it. Every write path in this
+process also calls bump_data_generation() after committing, which frees the now
+unreachable entries straight away. Size is bounded with LRU eviction and every
+entry also expires after a TTL.
+
+Rendered HTML pages get their own cache (cached_page), keyed on the tables the
+page renders (if any) and the asset build its script/stylesheet URLs come from.
+Data writes do not clear it. Each page is stored together with a gzip-compressed
+copy, so neither rendering nor compression is repeated until one of those changes.
+"""
+import gzip
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+from app.assets import asset_version
+from app.versions import TRACKED_TABLES, cache_variant, get_table_versions
+from config import (
+    PAGE_CACHE_ENABLED, PAGE_CACHE_MAX_ENTRIES, PAGE_CACHE_TTL,
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL
+)
+
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL,
+                 enabled=RESPONSE_CACHE_ENABLED):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            if key[0] != self.generation:
+                return  # computed before a write landed
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def bump(self):
+        """Invalidate everything by starting a new data generation"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'generation': self.generation,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+            }
+
+
+response_cache = ResponseCache()
+page_cache = ResponseCache(max_entries=PAGE_CACHE_MAX_ENTRIES, ttl=PAGE_CACHE_TTL, enabled=PAGE_CACHE_ENABLED)
+
+
+def bump_data_generation():
+    response_cache.bump()
+
+
+def _accepts_gzip():
+    return request.accept_encodings['gzip'] > 0
+
+
+def cached_response(view):
+    """Cache successful responses of a GET view until the next write or TTL expiry"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not response_cache.enabled:
+            return view(*args, **kwargs)
+
+        versions = tuple(sorted(get_table_versions(TRACKED_TABLES).items()))
+        key = (response_cache.generation, versions, cache_variant(), request.path,
+               tuple(sorted(request.args.items(multi=True))))
+        cached = response_cache.get(key)
+        if cached is not None:
+            body, status, mimetype = cached
+            return Response(body, status=status, mimetype=mimetype)
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+            response_cache.set(key, (response.get_data(), response.status_code, response.mimetype))
+        return response
+    return wrapper
+
+
+def cached_page(*tables):
+    """Cache a rendered page, plus a gzip copy, until one of the given tables or the asset build changes"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not page_cache.enabled:
+                return view(*args, **kwargs)
+
+            versions = tuple(sorted(get_table_versions(list(tables)).items())) if tables else ()
+            key = (page_cache.generation, versions, asset_version(), request.path,
+                   tuple(sorted(request.args.items(multi=True))))
+            cached = page_cache.get(key)
+            if cached is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                cached = (body, gzip.compress(body, compresslevel=6), response.mimetype)
+                page_cache.set(key, cached)
+
+            body, compressed, mimetype = cached
+            if _accepts_gzip():
+                response = Response(compressed, mimetype=mimetype)
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response = Response(body, mimetype=mimetype)
+            response.vary.add('Accept-Encoding')
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,72 @@
+import click
+from flask import current_app
+from app.assets import build_assets, prune_assets
+from app.database import db
+from app.dictionary import create_missing_indexes, migrate_to_dictionary_storage
+from app.import_jobs import add_missing_import_job_columns
+from app.rollups import rebuild_rollups
+from app.search import rebuild_search_index
+from app.slow_queries import summarize_log_file
+from config import DICTIONARY_MIGRATION_BATCH_SIZE, SLOW_QUERY_LOG_FILE
+
+
+def register_commands(app):
+    """Maintenance commands, e.g. `flask --app app rebuild-rollups`"""
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recompute the /stats rollup tables from data_entries"""
+        rebuild_rollups()
+        click.echo('Rollup tables rebuilt.')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Reindex data_entries into the FTS5 search table"""
+        rebuild_search_index()
+        click.echo('Search index rebuilt.')
+
+    @app.cli.command('upgrade-db')
+    @click.option('--batch-size', default=DICTIONARY_MIGRATION_BATCH_SIZE,
+                  help='Rows per transaction when dictionary-encoding an old database')
+    def upgrade_db_command(batch_size):
+        """Create missing tables and triggers on an existing database, then backfill derived data"""
+        migrate_to_dictionary_storage(batch_size, log=click.echo)
+        db.create_all()
+        add_missing_import_job_columns()
+        create_missing_indexes()
+        rebuild_rollups()
+        rebuild_search_index()
+        click.echo('Database upgraded.')
+
+    @app.cli.command('build-assets')
+    @click.option('--prune', is_flag=True,
+                  help='Also delete files of earlier builds older than STATIC_ASSET_RETENTION')
+    def build_assets_command(prune):
+        """Bundle, minify, fingerprint and gzip the static JS/CSS into static/dist"""
+        build_assets(current_app.static_folder, log=click.echo)
+        if prune:
+            removed = prune_assets(current_app.static_folder, log=click.echo)
+            click.echo(f'Pruned {removed} files of earlier builds.')
+        click.echo('Assets built; restart the app to pick up the new manifest.')
+
+    @app.cli.command('slow-queries')
+    @click.option('--limit', default=20, help='Number of statements to show')
+    @click.option('--log-file', default=SLOW_QUERY_LOG_FILE, help='Slow-query log to summarize')
+    def slow_queries_command(limit, log_file):
+        """Rank logged slow statements by total time and flag full-table scans"""
+        try:
+            statements = summarize_log_file(log_file, limit)
+        except FileNotFoundError:
+            click.echo(f'No slow-query log at {log_file}')
+            return
+
+        for rank, stats in enumerate(statements, 1):
+            flags = [flag for flag, present in (('FULL SCAN', stats['full_scan']),
+                                                ('TEMP B-TREE', stats['temp_btree'])) if present]
+            click.echo(f"{rank}. total {stats['total_ms']} ms, {stats['count']} calls, "
+                       f"mean {stats['mean_ms']} ms, max {stats['max_ms']} ms "
+                       f"{' '.join(f'[{flag}]' for flag in flags)}")
+            click.echo(f"   {stats['sql']}")
+            click.echo(f"   params: {stats['params_shape']}  routes: {', '.join(stats['routes'])}")
+            for _, detail in stats['plan']:
+                click.echo(f'   plan: {detail}')
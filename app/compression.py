@@ -0,0 +1,206 @@
+"""
+Response compression, negotiated from Accept-Encoding.
+
+An after_request hook compresses responses with gzip, or brotli when the brotli
+package is installed and the client prefers it. It skips:
+- bodies under COMPRESSION_MIN_SIZE
+- content types outside COMPRESSIBLE_MIMETYPES (Parquet/Arrow exports, images)
+- responses that already carry a Content-Encoding, like the gzip copies from the page cache
+- file passthroughs, partial content and `Cache-Control: no-transform`
+
+Streamed responses (NDJSON/JSON streams, CSV exports) are compressed chunk by
+chunk as the generator yields. The compressor is flushed every
+COMPRESSION_STREAM_FLUSH_SIZE input bytes, so clients keep receiving data
+without the whole body being buffered.
+
+Compressed responses get a weak ETag, since the bytes differ from the
+identity encoding; etag_response compares weakly, so 304s keep working.
+Compression ratio and CPU time are exported through /metrics.
+"""
+import threading
+import time
+import zlib
+
+from flask import request
+from config import (
+    COMPRESSIBLE_MIMETYPES, COMPRESSION_BROTLI_QUALITY, COMPRESSION_ENABLED, COMPRESSION_LEVEL,
+    COMPRESSION_MIN_SIZE, COMPRESSION_STREAM_FLUSH_SIZE
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class _GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+# Content-Encoding -> encoder, in order of preference
+ENCODERS = {'br': _BrotliEncoder} if brotli is not None else {}
+ENCODERS['gzip'] = _GzipEncoder
+
+
+class CompressionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = {}    # encoding -> count
+        self.skipped = {}      # reason -> count
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def record(self, encoding, bytes_in, bytes_out, cpu_seconds):
+        with self._lock:
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.cpu_seconds += cpu_seconds
+            if encoding is not None:
+                self.responses[encoding] = self.responses.get(encoding, 0) + 1
+
+    def skip(self, reason):
+        with self._lock:
+            self.skipped[reason] = self.skipped.get(reason, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': COMPRESSION_ENABLED,
+                'encodings': list(ENCODERS),
+                'responses': dict(self.responses),
+                'skipped': dict(self.skipped),
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'ratio': round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+                'cpu_seconds': round(self.cpu_seconds, 4),
+            }
+
+
+compression_stats = CompressionStats()
+
+
+def choose_encoding(accept_encodings):
+    """Best encoding the client accepts, or None"""
+    best, best_quality = None, 0
+    for encoding in ENCODERS:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _compressible(response):
+    return any(response.mimetype.startswith(prefix) for prefix in COMPRESSIBLE_MIMETYPES)
+
+
+def _skip_reason(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304) or request.method == 'HEAD':
+        return 'status'
+    if 'Content-Encoding' in response.headers:
+        return 'already_encoded'
+    if response.direct_passthrough:
+        return 'passthrough'
+    if not _compressible(response):
+        return 'content_type'
+    if 'no-transform' in response.cache_control:
+        return 'no_transform'
+    return None
+
+
+def _compress_body(response, encoding):
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_SIZE:
+        compression_stats.skip('too_small')
+        return
+    started = time.thread_time()
+    encoder = ENCODERS[encoding]()
+    compressed = encoder.compress(body) + encoder.finish()
+    compression_stats.record(encoding, len(body), len(compressed), time.thread_time() - started)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+
+
+def _compress_stream(chunks, original, encoding):
+    encoder = ENCODERS[encoding]()
+    bytes_in = bytes_out = unflushed = 0
+    cpu_seconds = 0.0
+    try:
+        for chunk in chunks:
+            started = time.thread_time()
+            data = encoder.compress(chunk)
+            unflushed += len(chunk)
+            if unflushed >= COMPRESSION_STREAM_FLUSH_SIZE:
+                data += encoder.flush()
+                unflushed = 0
+            cpu_seconds += time.thread_time() - started
+            bytes_in += len(chunk)
+            bytes_out += len(data)
+            if data:
+                yield data
+        started = time.thread_time()
+        data = encoder.finish()
+        cpu_seconds += time.thread_time() - started
+        bytes_out += len(data)
+        yield data
+    finally:
+        compression_stats.record(encoding, bytes_in, bytes_out, cpu_seconds)
+        if hasattr(original, 'close'):
+            original.close()
+
+
+def compress_response(response):
+    if not COMPRESSION_ENABLED:
+        return response
+    reason = _skip_reason(response)
+    if reason:
+        compression_stats.skip(reason)
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        compression_stats.skip('not_accepted')
+        return response
+
+    if response.is_streamed:
+        original = response.response
+        response.response = _compress_stream(response.iter_encoded(), original, encoding)
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        _compress_body(response, encoding)
+
+    if 'Content-Encoding' in response.headers:
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
@@ -1,14 +1,80 @@
-from flask import Flask
+from flask import Flask, has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from config import SQLITE_PROFILES, SQLITE_PROFILE, SQLITE_READ_POOL_SIZE, SQLITE_WRITE_POOL_TIMEOUT
+
+READ_BIND_KEY = 'reader'
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingSession(Session):
+    """Send read-only requests to the reader pool and everything else to the writer"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and has_request_context() and request.method in READ_ONLY_METHODS
+                and READ_BIND_KEY in self._db.engines):
+            return self._db.engines[READ_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def configure_storage(app: Flask):
+    """
+    Engine options for SQLite: a single writer connection (SQLite allows one writer
+    at a time, so writers queue in the pool instead of failing on a locked database)
+    plus a pool of query_only reader connections. Must run before db.init_app.
+    """
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if not uri.startswith('sqlite:///'):
+        return
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 1,
+        'max_overflow': 0,
+        'pool_timeout': SQLITE_WRITE_POOL_TIMEOUT,
+    }
+    if SQLITE_READ_POOL_SIZE > 0:
+        app.config['SQLALCHEMY_BINDS'] = {
+            READ_BIND_KEY: {
+                'url': uri,
+                'pool_size': SQLITE_READ_POOL_SIZE,
+                'max_overflow': 0,
+            }
+        }
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return set_pragmas
+
+
+def apply_storage_profile(app: Flask):
+    """Run the configured PRAGMAs on every new connection of every SQLite engine"""
+    pragmas = SQLITE_PROFILES[SQLITE_PROFILE]
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            engine_pragmas = dict(pragmas)
+            if bind_key == READ_BIND_KEY:
+                engine_pragmas['query_only'] = 'ON'
+            event.listen(engine, 'connect', _pragma_listener(engine_pragmas))
 
-db = SQLAlchemy()
 
 def init_app(app: Flask):
+    configure_storage(app)
     db.init_app(app)
+    apply_storage_profile(app)
 
 def create_database(app: Flask):
     """Create the database and all tables"""
     with app.app_context():
-        init_app(app)
         db.create_all()
         print("Database created successfully!")
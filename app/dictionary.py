@@ -0,0 +1,307 @@
+"""
+Dictionary encoding for the low-cardinality data_entries columns.
+
+device_type, data_type, data_set and data_going_to only have a few dozen distinct
+values each, so data_entries stores small integer ids into one dictionary table
+per column (device_types, data_types, data_sets, data_destinations). That keeps
+rows and the idx_data_set/idx_device_type/idx_company_data_set indexes narrow, and
+lets the rollups and GROUP BYs compare integers.
+
+DataEntry still exposes the strings as attributes, so ORM code and the API are
+unchanged. Set-based write paths call encode_entries() and read paths join the
+dictionaries in SQL (join_dictionaries). Lookups go through an in-process cache.
+A value first stored inside a transaction only enters that cache once the
+transaction commits, so a rollback never leaves an id behind that does not exist.
+Dictionary rows are never updated or deleted, so cached entries never go stale.
+"""
+import threading
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models.models import DataDestination, DataEntry, DataSet, DataType, DeviceType
+from app.database import RoutingSession, db
+from config import BULK_LOOKUP_CHUNK_SIZE, DICTIONARY_MIGRATION_BATCH_SIZE
+
+# data_entries column -> dictionary model
+DICTIONARY_COLUMNS = {
+    'device_type': DeviceType,
+    'data_type': DataType,
+    'data_set': DataSet,
+    'data_going_to': DataDestination,
+}
+
+# Decoded view of data_entries, used as the content table of the FTS index and for ad-hoc SQL
+DICTIONARY_VIEW_DDL = '''CREATE VIEW IF NOT EXISTS data_entry_values AS
+SELECT data_entries.id, data_entries.company_id, data_entries.uid, {columns}, data_entries.created_at
+FROM data_entries {joins}'''.format(
+    columns=', '.join(f'{column}_dict.value AS {column}' for column in DICTIONARY_COLUMNS),
+    joins=' '.join(
+        f'LEFT JOIN {model.__tablename__} AS {column}_dict ON {column}_dict.id = data_entries.{column}_id'
+        for column, model in DICTIONARY_COLUMNS.items()
+    ),
+)
+
+
+class DictionaryCache:
+    def __init__(self):
+        self._ids = {column: {} for column in DICTIONARY_COLUMNS}
+        self._values = {column: {} for column in DICTIONARY_COLUMNS}
+        self._lock = threading.Lock()
+
+    def get_id(self, column, value):
+        return self._ids[column].get(value)
+
+    def get_value(self, column, value_id):
+        return self._values[column].get(value_id)
+
+    def add(self, column, pairs):
+        with self._lock:
+            for value, value_id in pairs:
+                self._ids[column][value] = value_id
+                self._values[column][value_id] = value
+
+    def size(self):
+        return {column: len(ids) for column, ids in self._ids.items()}
+
+
+dictionary_cache = DictionaryCache()
+
+
+def _pending():
+    """{(column, value): id} interned by the current, not yet committed, transaction"""
+    return db.session.info.setdefault('dictionary_pending', {})
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _publish_pending(session):
+    pending = session.info.pop('dictionary_pending', None)
+    if pending:
+        for (column, value), value_id in pending.items():
+            dictionary_cache.add(column, [(value, value_id)])
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('dictionary_pending', None)
+
+
+def _load(column):
+    """Cache every committed value of a dictionary (they are small)"""
+    model = DICTIONARY_COLUMNS[column]
+    pending_ids = {value_id for (name, _), value_id in _pending().items() if name == column}
+    rows = db.session.execute(select(model.value, model.id)).all()
+    dictionary_cache.add(column, [(value, value_id) for value, value_id in rows
+                                  if value_id not in pending_ids])
+
+
+def intern_values(column, values):
+    """Return {value: id} for the given values, adding any that are new to the dictionary"""
+    pending = _pending()
+    ids = {}
+    missing = set()
+    for value in set(values):
+        if value is None:
+            continue
+        value_id = dictionary_cache.get_id(column, value) or pending.get((column, value))
+        if value_id is None:
+            missing.add(value)
+        else:
+            ids[value] = value_id
+    if not missing:
+        return ids
+
+    _load(column)
+    new_values = []
+    for value in missing:
+        value_id = dictionary_cache.get_id(column, value)
+        if value_id is None:
+            new_values.append(value)
+        else:
+            ids[value] = value_id
+
+    model = DICTIONARY_COLUMNS[column]
+    if new_values:
+        db.session.execute(
+            sqlite_insert(model).on_conflict_do_nothing(index_elements=['value']),
+            [{'value': value} for value in new_values]
+        )
+        for start in range(0, len(new_values), BULK_LOOKUP_CHUNK_SIZE):
+            chunk = new_values[start:start + BULK_LOOKUP_CHUNK_SIZE]
+            for value, value_id in db.session.execute(
+                select(model.value, model.id).where(model.value.in_(chunk))
+            ):
+                pending[(column, value)] = value_id
+                ids[value] = value_id
+    return ids
+
+
+def intern_value(column, value):
+    if value is None:
+        return None
+    return intern_values(column, [value])[value]
+
+
+def lookup_value(column, value_id):
+    """Dictionary id -> string"""
+    if value_id is None:
+        return None
+    value = dictionary_cache.get_value(column, value_id)
+    if value is None:
+        for (name, pending_value), pending_id in _pending().items():
+            if name == column and pending_id == value_id:
+                return pending_value
+        _load(column)
+        value = dictionary_cache.get_value(column, value_id)
+    return value
+
+
+def encode_entries(entries):
+    """Replace the string dictionary fields of row dicts with their `<column>_id` keys, in place"""
+    for column in DICTIONARY_COLUMNS:
+        if not any(column in entry for entry in entries):
+            continue
+        ids = intern_values(column, [entry[column] for entry in entries if column in entry])
+        for entry in entries:
+            if column in entry:
+                entry[f'{column}_id'] = ids.get(entry.pop(column))
+    return entries
+
+
+def value_id_subquery(column, value):
+    """SQL for the id of a dictionary value, so filters can use the integer indexes"""
+    model = DICTIONARY_COLUMNS[column]
+    return select(model.id).where(model.value == value).scalar_subquery()
+
+
+def value_column(column):
+    """Selectable string column for a dictionary field, once join_dictionaries() is applied"""
+    return DICTIONARY_COLUMNS[column].value.label(column)
+
+
+def join_dictionaries(stmt, columns=DICTIONARY_COLUMNS):
+    """Outer-join the dictionary tables (of all or the given columns) onto a statement over data_entries"""
+    for column in columns:
+        model = DICTIONARY_COLUMNS[column]
+        stmt = stmt.outerjoin(model, model.id == getattr(DataEntry, f'{column}_id'))
+    return stmt
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_view(target, connection, **kw):
+    connection.exec_driver_sql(DICTIONARY_VIEW_DDL)
+
+
+# Online migration from the original schema, where the four columns were TEXT
+
+LEGACY_TRIGGERS = [
+    'trg_rollup_insert', 'trg_rollup_delete', 'trg_rollup_update',
+    'trg_search_insert', 'trg_search_delete', 'trg_search_update',
+]
+LEGACY_INDEXES = ['idx_data_set', 'idx_company_data_set', 'idx_device_type']
+LEGACY_DERIVED_TABLES = ['data_entries_fts', 'company_data_set_counts', 'company_device_type_counts']
+
+
+def legacy_columns(connection):
+    """Dictionary columns still stored as TEXT in data_entries"""
+    names = {row[1] for row in connection.exec_driver_sql('PRAGMA table_info(data_entries)')}
+    return [column for column in DICTIONARY_COLUMNS if column in names]
+
+
+def _fill_dictionaries(connection, columns):
+    for column in columns:
+        connection.exec_driver_sql(
+            f'INSERT OR IGNORE INTO {DICTIONARY_COLUMNS[column].__tablename__} (value) '
+            f'SELECT DISTINCT {column} FROM data_entries WHERE {column} IS NOT NULL'
+        )
+
+
+def _encode_sql(columns):
+    return ', '.join(
+        f'{column}_id = (SELECT id FROM {DICTIONARY_COLUMNS[column].__tablename__} '
+        f'WHERE value = data_entries.{column})'
+        for column in columns
+    )
+
+
+def _sync_triggers(columns):
+    """
+    Triggers that keep {column}_id current while the old TEXT columns are still written,
+    so rows changed after their batch was backfilled are not left with a stale id
+    """
+    statements = ''.join(
+        f'INSERT OR IGNORE INTO {DICTIONARY_COLUMNS[column].__tablename__} (value) '
+        f'SELECT NEW.{column} WHERE NEW.{column} IS NOT NULL; '
+        for column in columns
+    )
+    statements += f'UPDATE data_entries SET {_encode_sql(columns)} WHERE id = NEW.id;'
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS trg_dictionary_sync_insert AFTER INSERT ON data_entries '
+        f'BEGIN {statements} END',
+        f"CREATE TRIGGER IF NOT EXISTS trg_dictionary_sync_update AFTER UPDATE OF {', '.join(columns)} "
+        f'ON data_entries BEGIN {statements} END',
+    ]
+
+
+SYNC_TRIGGERS = ['trg_dictionary_sync_insert', 'trg_dictionary_sync_update']
+
+
+def migrate_to_dictionary_storage(batch_size=DICTIONARY_MIGRATION_BATCH_SIZE, log=print):
+    """
+    Convert a database with TEXT dictionary columns in place. Ids are backfilled in
+    short transactions of batch_size rows, so the app keeps serving meanwhile, and
+    temporary triggers re-encode every row inserted or updated from the moment the id
+    columns exist. Only the final cutover (drop the TEXT columns and the derived
+    tables built on them) takes the write lock for longer. Afterwards the
+    caller must recreate the derived tables (see the upgrade-db command).
+    Returns the number of columns converted.
+    """
+    with db.engine.connect() as connection:
+        columns = legacy_columns(connection)
+        existing = {row[1] for row in connection.exec_driver_sql('PRAGMA table_info(data_entries)')}
+    if not columns:
+        return 0
+
+    for model in DICTIONARY_COLUMNS.values():
+        model.__table__.create(bind=db.engine, checkfirst=True)
+
+    with db.engine.begin() as connection:
+        for column in columns:
+            if f'{column}_id' not in existing:
+                connection.exec_driver_sql(
+                    f'ALTER TABLE data_entries ADD COLUMN {column}_id INTEGER '
+                    f'REFERENCES {DICTIONARY_COLUMNS[column].__tablename__}(id)'
+                )
+        for trigger_sql in _sync_triggers(columns):
+            connection.exec_driver_sql(trigger_sql)
+        _fill_dictionaries(connection, columns)
+        max_id = connection.exec_driver_sql('SELECT MAX(id) FROM data_entries').scalar() or 0
+
+    encode_sql = _encode_sql(columns)
+    for start in range(0, max_id, batch_size):
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(
+                f'UPDATE data_entries SET {encode_sql} WHERE id > ? AND id <= ?',
+                (start, start + batch_size)
+            )
+        log(f'Encoded rows up to id {min(start + batch_size, max_id)} of {max_id}')
+
+    with db.engine.begin() as connection:
+        for trigger in LEGACY_TRIGGERS + SYNC_TRIGGERS:
+            connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+        connection.exec_driver_sql('DROP VIEW IF EXISTS data_entry_values')
+        for table in LEGACY_DERIVED_TABLES:
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS {table}')
+
+        for index in LEGACY_INDEXES:
+            connection.exec_driver_sql(f'DROP INDEX IF EXISTS {index}')
+        for column in columns:
+            connection.exec_driver_sql(f'ALTER TABLE data_entries DROP COLUMN {column}')
+
+    log(f"Dictionary-encoded {', '.join(columns)}; run VACUUM during a quiet period to reclaim the freed space")
+    return len(columns)
+
+
+def create_missing_indexes():
+    """create_all() skips indexes of tables that already exist"""
+    for index in DataEntry.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
@@ -0,0 +1,123 @@
+"""
+Streaming exports of data entries.
+
+Rows come from a server-side cursor (yield_per), so memory stays constant however
+many rows are exported. The column layout is the one upload-csv accepts, which
+makes every export re-importable:
+
+    company, device_type, uid, data_type, data_set, data_going_to
+
+CSV is written row by row. Parquet and Arrow IPC are written in record batches
+and need the optional pyarrow package.
+"""
+import csv
+import io
+
+from sqlalchemy import select
+from app.models.models import Company, DataEntry
+from app.database import db
+from app.metrics import record_rows
+from app.dictionary import join_dictionaries, value_column
+from app.serializers import filter_data_entries
+from config import EXPORT_BATCH_SIZE
+
+EXPORT_COLUMNS = ['company', 'device_type', 'uid', 'data_type', 'data_set', 'data_going_to']
+
+
+def export_select(**filters):
+    stmt = select(
+        Company.name.label('company'),
+        value_column('device_type'),
+        DataEntry.uid,
+        value_column('data_type'),
+        value_column('data_set'),
+        value_column('data_going_to'),
+    ).join_from(DataEntry, Company, DataEntry.company_id == Company.id)
+    stmt = join_dictionaries(stmt)
+    return filter_data_entries(stmt, **filters).order_by(DataEntry.id)
+
+
+def _row_batches(stmt):
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        record_rows(len(partition))
+        yield partition
+
+
+def generate_csv(stmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in _row_batches(stmt):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents are handed off as they are written"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _record_batches(pa, stmt):
+    for rows in _row_batches(stmt):
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column, type=pa.string()) for column in columns],
+            names=EXPORT_COLUMNS
+        )
+
+
+def generate_arrow(stmt, fmt):
+    """Yield a Parquet file or an Arrow IPC stream one record batch at a time"""
+    import pyarrow as pa
+
+    schema = pa.schema([(name, pa.string()) for name in EXPORT_COLUMNS])
+    sink = _DrainableSink()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+        write = writer.write_batch
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema)
+        write = writer.write_batch
+
+    try:
+        for batch in _record_batches(pa, stmt):
+            write(batch)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
@@ -0,0 +1,273 @@
+"""
+Background CSV import jobs.
+
+An upload is spooled to disk and handed to a small thread pool, which parses it
+incrementally with csv.DictReader and imports it in batches through
+app.bulk_import. Each batch commits together with the job's progress row in
+import_jobs, so status is visible to every web worker process and a crash never
+leaves progress ahead of the data. Cancellation is checked between batches; rows
+from batches that already committed are kept.
+
+shutdown_import_jobs stops a process from taking new jobs and lets its running
+ones finish, up to a timeout. Jobs still running after that stop at their next
+batch boundary and are marked failed with how far they got. They are not marked
+cancelled, because nobody asked for that.
+
+The number of queued + running jobs is capped by MAX_CONCURRENT_IMPORT_JOBS so
+imports cannot starve the web workers of the single SQLite writer. The cap is
+checked by the INSERT that creates the job, so concurrent uploads in different
+threads or worker processes cannot both slip under it. Each job records the pid
+of the process running it and a heartbeat bumped with every batch; active jobs
+whose process is gone (a crash, SIGKILL or restart) or whose heartbeat is older
+than IMPORT_JOB_STALE_SECONDS are failed by reap_stale_import_jobs, so they do
+not hold slots forever.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, literal, select
+
+from app.bulk_import import batches, import_batch
+from app.cache import bump_data_generation
+from app.models.models import ImportJob
+from app.database import db
+from config import (
+    BULK_IMPORT_BATCH_SIZE, IMPORT_JOB_MAX_ERRORS, IMPORT_JOB_STALE_SECONDS, IMPORT_SPOOL_DIR,
+    MAX_CONCURRENT_IMPORT_JOBS
+)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_executor = None
+_executor_lock = threading.Lock()
+_submitted_jobs = set()  # ids of jobs queued on this process's executor
+_draining = threading.Event()  # set once this process stops taking new jobs
+_interrupted = threading.Event()  # set when running jobs must stop at their next batch
+
+
+class TooManyImportJobs(Exception):
+    pass
+
+
+class ImportJobsShuttingDown(Exception):
+    pass
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_IMPORT_JOBS,
+                                           thread_name_prefix='import-job')
+        return _executor
+
+
+def active_job_count():
+    return ImportJob.query.filter(ImportJob.status.in_(ACTIVE_STATUSES)).count()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _job_alive(job, cutoff):
+    if job.id in _submitted_jobs:
+        return True
+    # Our own pid on a job we never submitted means the pid was reused after a restart
+    if job.owner_pid is None or job.owner_pid == os.getpid() or not _process_alive(job.owner_pid):
+        return False
+    return job.heartbeat_at is not None and job.heartbeat_at >= cutoff
+
+
+def reap_stale_import_jobs():
+    """Fail queued/running jobs whose process has exited or stopped making progress; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(seconds=IMPORT_JOB_STALE_SECONDS)
+    stale = [job for job in ImportJob.query.filter(ImportJob.status.in_(ACTIVE_STATUSES)).all()
+             if not _job_alive(job, cutoff)]
+    for job in stale:
+        job.status = 'failed'
+        job.finished_at = datetime.utcnow()
+        _record_errors(job, [f'Import interrupted after {job.rows_processed} rows: '
+                             'the process running it exited or stopped responding'])
+    db.session.commit()
+    return len(stale)
+
+
+def add_missing_import_job_columns():
+    """create_all() does not add columns to an import_jobs table created by an older version"""
+    with db.engine.begin() as connection:
+        existing = {row[1] for row in connection.exec_driver_sql('PRAGMA table_info(import_jobs)')}
+        for column in ('owner_pid', 'heartbeat_at'):
+            if column not in existing:
+                column_type = ImportJob.__table__.c[column].type.compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f'ALTER TABLE import_jobs ADD COLUMN {column} {column_type}')
+
+
+def _reserve_job(values):
+    """INSERT the job only while fewer than MAX_CONCURRENT_IMPORT_JOBS are active, as one statement"""
+    columns = ImportJob.__table__.c
+    active = select(func.count()).select_from(ImportJob).where(
+        ImportJob.status.in_(ACTIVE_STATUSES)
+    ).scalar_subquery()
+    row = select(*[literal(value, columns[name].type) for name, value in values.items()])
+    stmt = insert(ImportJob).from_select(list(values), row.where(active < MAX_CONCURRENT_IMPORT_JOBS))
+    return db.session.execute(stmt).rowcount == 1
+
+
+def submit_import_job(app, file_storage):
+    """Spool an uploaded file to disk and queue it. Raises TooManyImportJobs at the cap."""
+    if _draining.is_set():
+        raise ImportJobsShuttingDown('this server is shutting down; try again shortly')
+    reap_stale_import_jobs()
+
+    job_id = uuid.uuid4().hex
+    os.makedirs(IMPORT_SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f'import-{job_id}-', suffix='.csv', dir=IMPORT_SPOOL_DIR)
+    with os.fdopen(fd, 'wb') as spool:
+        file_storage.save(spool)
+
+    now = datetime.utcnow()
+    _submitted_jobs.add(job_id)
+    reserved = _reserve_job({
+        'id': job_id, 'filename': file_storage.filename, 'status': 'queued',
+        'bytes_total': os.path.getsize(path), 'bytes_read': 0, 'rows_processed': 0,
+        'rows_imported': 0, 'error_count': 0, 'cancel_requested': False,
+        'owner_pid': os.getpid(), 'heartbeat_at': now, 'created_at': now,
+    })
+    if not reserved:
+        db.session.rollback()
+        _submitted_jobs.discard(job_id)
+        os.remove(path)
+        raise TooManyImportJobs(
+            f'{MAX_CONCURRENT_IMPORT_JOBS} import jobs are already running; try again later'
+        )
+    db.session.commit()
+
+    _get_executor().submit(_run_job, app, job_id, path)
+    return db.session.get(ImportJob, job_id)
+
+
+def cancel_import_job(job):
+    """Ask a queued or running job to stop before its next batch"""
+    if job.status in ACTIVE_STATUSES:
+        job.cancel_requested = True
+        db.session.commit()
+    return job
+
+
+def running_job_count():
+    """Jobs queued or running in this process"""
+    return len(_submitted_jobs)
+
+
+def shutdown_import_jobs(timeout=0):
+    """
+    Stop taking new jobs and give this process's jobs up to `timeout` seconds to finish;
+    the rest stop at their next batch boundary and are failed as interrupted
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+        if executor is None:
+            return  # never ran a job; e.g. the gunicorn master, whose flags forked workers would inherit
+        _draining.set()
+    deadline = time.monotonic() + timeout
+    while _submitted_jobs and time.monotonic() < deadline:
+        time.sleep(0.1)
+    _interrupted.set()
+    executor.shutdown(wait=True)
+
+
+def _record_errors(job, messages):
+    if not messages:
+        return
+    job.error_count += len(messages)
+    stored = json.loads(job.errors) if job.errors else []
+    room = IMPORT_JOB_MAX_ERRORS - len(stored)
+    if room > 0:
+        stored.extend(messages[:room])
+        job.errors = json.dumps(stored)
+
+
+def _interrupt(job):
+    job.status = 'failed'
+    _record_errors(job, [f'Import interrupted by a server shutdown after {job.rows_processed} rows; '
+                         'those rows were kept, upload the rest again'])
+
+
+def _run_job(app, job_id, path):
+    with app.app_context():
+        try:
+            job = db.session.get(ImportJob, job_id)
+            if job.cancel_requested:
+                job.status = 'cancelled'
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                return
+            if _interrupted.is_set():
+                _interrupt(job)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                return
+
+            job.status = 'running'
+            job.started_at = job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+            seen_uids = set()
+            with open(path, 'rb') as raw:
+                reader = csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8', newline=''))
+                for batch in batches(reader, BULK_IMPORT_BATCH_SIZE):
+                    db.session.refresh(job)
+                    if job.cancel_requested:
+                        job.status = 'cancelled'
+                        break
+                    if _interrupted.is_set():
+                        _interrupt(job)
+                        break
+
+                    imported, errors = import_batch(batch, seen_uids)
+                    job.rows_processed += len(batch)
+                    job.rows_imported += imported
+                    job.bytes_read = raw.tell()
+                    job.heartbeat_at = datetime.utcnow()
+                    _record_errors(job, errors)
+                    db.session.commit()
+                    if imported:
+                        bump_data_generation()
+                else:
+                    job.status = 'completed'
+                    job.bytes_read = job.bytes_total
+
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(ImportJob, job_id)
+            if job is not None:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+                _record_errors(job, [f'Failed to process file: {str(e)}'])
+                db.session.commit()
+        finally:
+            _submitted_jobs.discard(job_id)
+            db.session.remove()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
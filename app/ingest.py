@@ -0,0 +1,238 @@
+"""
+Chunked ingest pipeline for partner workbooks and CSV exports.
+
+Files are read in fixed-size chunks, normalized with vectorized pandas operations
+and upserted in bulk (one transaction per chunk), so memory stays flat regardless of
+file size. Directories can be processed in parallel worker processes:
+
+    python -m app.ingest data/partners/ --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from flask import has_app_context
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.bulk_import import ENTRY_FIELDS, resolve_company_ids, existing_uids
+from app.dictionary import encode_entries
+from app.models.models import Company, DataEntry
+from app.database import db
+from config import INGEST_CHUNK_SIZE
+
+# Source column -> data_entries column
+COLUMN_MAP = {
+    'Partner': 'company',
+    'DeviceType': 'device_type',
+    'UID': 'uid',
+    'DataType': 'data_type',
+    'DataSet': 'data_set',
+    'Datagoingto': 'data_going_to',
+}
+REQUIRED_COLUMNS = ['Partner', 'UID']
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xlsm')
+
+
+def _canonical_columns(columns):
+    """Match source headers to COLUMN_MAP ignoring case and surrounding whitespace"""
+    lookup = {name.lower(): name for name in COLUMN_MAP}
+    renamed = {}
+    for column in columns:
+        canonical = lookup.get(str(column).strip().lower())
+        if canonical:
+            renamed[column] = COLUMN_MAP[canonical]
+
+    missing = [name for name in REQUIRED_COLUMNS if COLUMN_MAP[name] not in renamed.values()]
+    if missing:
+        raise ValueError(f"Missing required column(s): {', '.join(missing)}")
+    return renamed
+
+
+def _read_excel_chunks(path, chunk_size):
+    """Stream an Excel sheet with openpyxl's read-only mode, chunk_size rows at a time"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header)
+    finally:
+        workbook.close()
+
+
+def read_chunks(path, chunk_size=INGEST_CHUNK_SIZE):
+    """Yield DataFrames of at most chunk_size rows from a CSV or Excel file"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    elif extension in ('.xlsx', '.xlsm'):
+        yield from _read_excel_chunks(path, chunk_size)
+    else:
+        raise ValueError(f'Unsupported file type: {path}')
+
+
+def normalize_chunk(df):
+    """
+    Rename, clean and validate one chunk. Returns the cleaned frame and the number of
+    rows rejected for a missing company or UID.
+    """
+    df = df.rename(columns=_canonical_columns(df.columns))
+    df = df[[column for column in COLUMN_MAP.values() if column in df.columns]]
+    df = df.reindex(columns=list(COLUMN_MAP.values()))
+
+    df = df.astype('string').apply(lambda column: column.str.strip())
+    df = df.replace('', pd.NA)
+
+    valid = df['company'].notna() & df['uid'].notna()
+    rejected = int((~valid).sum())
+    df = df[valid].drop_duplicates(subset='uid', keep='last')
+    return df, rejected
+
+
+def _upsert_companies(names):
+    """Insert any missing companies and return {name: id} for all of them"""
+    company_ids = resolve_company_ids(names)
+    missing = [name for name in names if name not in company_ids]
+    if missing:
+        db.session.execute(
+            sqlite_insert(Company).on_conflict_do_nothing(index_elements=['name']),
+            [{'name': name} for name in missing]
+        )
+        company_ids.update(resolve_company_ids(missing))
+    return company_ids, len(missing)
+
+
+def upsert_chunk(df):
+    """Upsert a normalized chunk in one transaction"""
+    company_ids, companies_created = _upsert_companies(df['company'].unique().tolist())
+
+    df = df.assign(company_id=df['company'].map(company_ids).astype('int64'))
+    df = df.astype(object).where(df.notna(), None)
+
+    stored = existing_uids(df['uid'].tolist())
+    is_update = df['uid'].isin(stored)
+    columns = ['company_id'] + ENTRY_FIELDS
+
+    new_rows = encode_entries(df.loc[~is_update, columns].to_dict('records'))
+    if new_rows:
+        db.session.execute(insert(DataEntry), new_rows)
+
+    updated_rows = encode_entries(
+        df.loc[is_update, columns].rename(columns={'uid': 'b_uid'}).to_dict('records')
+    )
+    if updated_rows:
+        table = DataEntry.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.uid == bindparam('b_uid'))
+            .values({key: bindparam(key) for key in updated_rows[0] if key != 'b_uid'}),
+            updated_rows
+        )
+
+    db.session.commit()
+    return {
+        'inserted': len(new_rows),
+        'updated': len(updated_rows),
+        'companies_created': companies_created,
+    }
+
+
+def ingest_file(path, chunk_size=INGEST_CHUNK_SIZE):
+    """Ingest one file chunk by chunk. Must be called inside an app context."""
+    started = time.perf_counter()
+    summary = {'file': path, 'rows_read': 0, 'rejected': 0,
+               'inserted': 0, 'updated': 0, 'companies_created': 0}
+
+    for chunk in read_chunks(path, chunk_size):
+        summary['rows_read'] += len(chunk)
+        df, rejected = normalize_chunk(chunk)
+        summary['rejected'] += rejected
+        if df.empty:
+            continue
+        try:
+            result = upsert_chunk(df)
+        except Exception:
+            db.session.rollback()
+            raise
+        for key, value in result.items():
+            summary[key] += value
+
+    elapsed = time.perf_counter() - started
+    summary['elapsed_seconds'] = round(elapsed, 3)
+    summary['rows_per_sec'] = round(summary['rows_read'] / elapsed, 1) if elapsed > 0 else None
+    return summary
+
+
+def _ingest_in_new_app(path, chunk_size):
+    """Worker process entry point: each process owns its own app and engine"""
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        return ingest_file(path, chunk_size)
+
+
+def collect_files(paths):
+    """Expand directories into the supported files they contain"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+
+def ingest_paths(paths, workers=1, chunk_size=INGEST_CHUNK_SIZE):
+    """Ingest files and directories, optionally across several worker processes"""
+    files = collect_files(paths)
+    if workers <= 1 or len(files) <= 1:
+        if has_app_context():
+            return [ingest_file(path, chunk_size) for path in files]
+        return [_ingest_in_new_app(path, chunk_size) for path in files]
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        futures = {pool.submit(_ingest_in_new_app, path, chunk_size): path for path in files}
+        for future in as_completed(futures):
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                summaries.append({'file': futures[future], 'error': str(e)})
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ingest partner Excel/CSV files into the database')
+    parser.add_argument('paths', nargs='+', help='Files or directories to ingest')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=INGEST_CHUNK_SIZE, help='Rows per chunk')
+    args = parser.parse_args(argv)
+
+    for summary in ingest_paths(args.paths, workers=args.workers, chunk_size=args.chunk_size):
+        if 'error' in summary:
+            print(f"{summary['file']}: FAILED - {summary['error']}")
+        else:
+            print(f"{summary['file']}: {summary['rows_read']} rows, "
+                  f"{summary['inserted']} inserted, {summary['updated']} updated, "
+                  f"{summary['rejected']} rejected, {summary['companies_created']} new companies "
+                  f"({summary['rows_per_sec']} rows/sec)")
+
+
+if __name__ == '__main__':
+    main()
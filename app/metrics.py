@@ -0,0 +1,174 @@
+"""
+Per-request latency and SQL instrumentation, exposed in Prometheus text format.
+
+SQLAlchemy engine events count every statement and its duration against the
+request that issued it; Flask request hooks record latency per endpoint. Rows
+returned are counted where results are materialized (app.serializers, exports).
+With SERVER_TIMING_ENABLED, responses carry a Server-Timing header splitting the
+request into database time and the rest (serialization and Python work).
+
+Streamed bodies run after the request is recorded, so their rows and queries are
+not counted. Metrics are per process; scrape each worker or aggregate downstream.
+"""
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import SERVER_TIMING_ENABLED
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency = {}     # (endpoint, method) -> Histogram
+        self.request_queries = {}     # (endpoint, method) -> Histogram
+        self.requests_total = {}      # (endpoint, method, status) -> int
+        self.query_count = {}         # (endpoint, method) -> int
+        self.query_seconds = {}       # (endpoint, method) -> float
+        self.rows_returned = {}       # (endpoint, method) -> int
+
+    def record_request(self, endpoint, method, status, duration, queries, query_seconds, rows):
+        key = (endpoint, method)
+        with self._lock:
+            self.request_latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(duration)
+            self.request_queries.setdefault(key, Histogram(QUERY_COUNT_BUCKETS)).observe(queries)
+            status_key = (endpoint, method, str(status))
+            self.requests_total[status_key] = self.requests_total.get(status_key, 0) + 1
+            self.query_count[key] = self.query_count.get(key, 0) + queries
+            self.query_seconds[key] = self.query_seconds.get(key, 0.0) + query_seconds
+            self.rows_returned[key] = self.rows_returned.get(key, 0) + rows
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'request_latency': {key: (list(h.counts), h.total, h.count, h.buckets)
+                                    for key, h in self.request_latency.items()},
+                'request_queries': {key: (list(h.counts), h.total, h.count, h.buckets)
+                                    for key, h in self.request_queries.items()},
+                'requests_total': dict(self.requests_total),
+                'query_count': dict(self.query_count),
+                'query_seconds': dict(self.query_seconds),
+                'rows_returned': dict(self.rows_returned),
+            }
+
+
+registry = MetricsRegistry()
+
+
+# SQL instrumentation (all engines, reader and writer alike)
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_start'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_start' in g:
+        started = conn.info.get('query_start', time.perf_counter())
+        g.metrics_queries += 1
+        g.metrics_query_seconds += time.perf_counter() - started
+
+
+def record_rows(count):
+    """Count rows handed back to the client by the current request"""
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_rows += count
+
+
+def init_metrics(app):
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_query_seconds = 0.0
+        g.metrics_rows = 0
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_start' not in g:
+            return response
+        duration = time.perf_counter() - g.metrics_start
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        registry.record_request(endpoint, request.method, response.status_code, duration,
+                                g.metrics_queries, g.metrics_query_seconds, g.metrics_rows)
+
+        if SERVER_TIMING_ENABLED:
+            db_ms = g.metrics_query_seconds * 1000
+            total_ms = duration * 1000
+            response.headers['Server-Timing'] = (
+                f'db;dur={db_ms:.2f};desc="{g.metrics_queries} queries", '
+                f'app;dur={max(total_ms - db_ms, 0):.2f};desc="serialization and Python", '
+                f'total;dur={total_ms:.2f}'
+            )
+        return response
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, histograms):
+    lines = []
+    for (endpoint, method), (counts, total, count, buckets) in sorted(histograms.items()):
+        for bound, bucket_count in zip(buckets, counts):
+            lines.append(f'{name}_bucket{_labels(endpoint=endpoint, method=method, le=bound)} {bucket_count}')
+        lines.append(f'{name}_bucket{_labels(endpoint=endpoint, method=method, le="+Inf")} {count}')
+        lines.append(f'{name}_sum{_labels(endpoint=endpoint, method=method)} {total}')
+        lines.append(f'{name}_count{_labels(endpoint=endpoint, method=method)} {count}')
+    return lines
+
+
+def _counter_lines(name, values):
+    return [f'{name}{_labels(endpoint=endpoint, method=method)} {value}'
+            for (endpoint, method), value in sorted(values.items())]
+
+
+def render_prometheus(extra_sections=()):
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    data = registry.snapshot()
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by endpoint.',
+        '# TYPE http_request_duration_seconds histogram',
+        *_histogram_lines('http_request_duration_seconds', data['request_latency']),
+        '# HELP http_requests_total Requests by endpoint and status code.',
+        '# TYPE http_requests_total counter',
+        *[f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {value}'
+          for (endpoint, method, status), value in sorted(data['requests_total'].items())],
+        '# HELP db_queries_per_request SQL statements issued per request.',
+        '# TYPE db_queries_per_request histogram',
+        *_histogram_lines('db_queries_per_request', data['request_queries']),
+        '# HELP db_queries_total SQL statements issued by endpoint.',
+        '# TYPE db_queries_total counter',
+        *_counter_lines('db_queries_total', data['query_count']),
+        '# HELP db_query_seconds_total Time spent executing SQL by endpoint.',
+        '# TYPE db_query_seconds_total counter',
+        *_counter_lines('db_query_seconds_total', data['query_seconds']),
+        '# HELP db_rows_returned_total Rows serialized into responses by endpoint.',
+        '# TYPE db_rows_returned_total counter',
+        *_counter_lines('db_rows_returned_total', data['rows_returned']),
+    ]
+    for section in extra_sections:
+        lines.extend(section)
+    return '\n'.join(lines) + '\n'
@@ -1,5 +1,8 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.hybrid import hybrid_property
 from ..database import db
 
 
@@ -21,25 +24,72 @@ class Company(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+# Dictionary tables for the low-cardinality DataEntry columns (app/dictionary.py)
+class DictionaryMixin:
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    value = db.Column(db.String(255), unique=True, nullable=False)
+
+
+class DeviceType(DictionaryMixin, db.Model):
+    __tablename__ = 'device_types'
+
+
+class DataType(DictionaryMixin, db.Model):
+    __tablename__ = 'data_types'
+
+
+class DataSet(DictionaryMixin, db.Model):
+    __tablename__ = 'data_sets'
+
+
+class DataDestination(DictionaryMixin, db.Model):
+    __tablename__ = 'data_destinations'
+
+
+def dictionary_value(column, dictionary):
+    """String attribute stored as the integer column `<column>_id` into a dictionary table"""
+    id_column = f'{column}_id'
+
+    def fget(self):
+        from app.dictionary import lookup_value
+        return lookup_value(column, getattr(self, id_column))
+
+    def fset(self, value):
+        from app.dictionary import intern_value
+        setattr(self, id_column, intern_value(column, value))
+
+    def expr(cls):
+        return select(dictionary.value).where(dictionary.id == getattr(cls, id_column)).scalar_subquery()
+
+    return hybrid_property(fget, fset, expr=expr)
+
+
 class DataEntry(db.Model):
     __tablename__ = 'data_entries'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
-    device_type = db.Column(db.String(100))
+    device_type_id = db.Column(db.Integer, db.ForeignKey('device_types.id'))
     uid = db.Column(db.String(255))
-    data_type = db.Column(db.String(100))
-    data_set = db.Column(db.String(255))
-    data_going_to = db.Column(db.String(255))
+    data_type_id = db.Column(db.Integer, db.ForeignKey('data_types.id'))
+    data_set_id = db.Column(db.Integer, db.ForeignKey('data_sets.id'))
+    data_going_to_id = db.Column(db.Integer, db.ForeignKey('data_destinations.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # The API still reads and writes these as strings
+    device_type = dictionary_value('device_type', DeviceType)
+    data_type = dictionary_value('data_type', DataType)
+    data_set = dictionary_value('data_set', DataSet)
+    data_going_to = dictionary_value('data_going_to', DataDestination)
     
     # Indexes are created automatically by SQLAlchemy for foreign keys
     __table_args__ = (
         db.Index('idx_uid', 'uid'),
-        db.Index('idx_data_set', 'data_set'),
-        db.Index('idx_company_data_set', 'company_id', 'data_set'),
+        db.Index('idx_data_set', 'data_set_id'),
+        db.Index('idx_company_data_set', 'company_id', 'data_set_id'),
         db.Index('idx_uid_company', 'uid', 'company_id'),
-        db.Index('idx_device_type', 'device_type'),
+        db.Index('idx_device_type', 'device_type_id'),
+        db.Index('idx_created_at', 'created_at'),
     )
     
     def to_dict(self):
@@ -54,3 +104,111 @@ class DataEntry(db.Model):
             'data_going_to': self.data_going_to,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+
+
+# Rollup tables, maintained by the triggers in app/rollups.py
+class CompanyDataSetCount(db.Model):
+    __tablename__ = 'company_data_set_counts'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
+    data_set_id = db.Column(db.Integer, db.ForeignKey('data_sets.id'))
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('idx_rollup_company_data_set', 'company_id', 'data_set_id'),
+    )
+
+
+class CompanyDeviceTypeCount(db.Model):
+    __tablename__ = 'company_device_type_counts'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
+    device_type_id = db.Column(db.Integer, db.ForeignKey('device_types.id'))
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('idx_rollup_company_device_type', 'company_id', 'device_type_id'),
+    )
+
+
+
+# Time-bucketed rollups: bucket_start is created_at truncated to the hour/day, in UTC epoch seconds
+class EntryHourlyCount(db.Model):
+    __tablename__ = 'entry_hourly_counts'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
+    data_set_id = db.Column(db.Integer, db.ForeignKey('data_sets.id'))
+    bucket_start = db.Column(db.Integer)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('idx_hourly_company_data_set_bucket', 'company_id', 'data_set_id', 'bucket_start'),
+        db.Index('idx_hourly_bucket', 'bucket_start'),
+    )
+
+
+class EntryDailyCount(db.Model):
+    __tablename__ = 'entry_daily_counts'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
+    data_set_id = db.Column(db.Integer, db.ForeignKey('data_sets.id'))
+    bucket_start = db.Column(db.Integer)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('idx_daily_company_data_set_bucket', 'company_id', 'data_set_id', 'bucket_start'),
+        db.Index('idx_daily_bucket', 'bucket_start'),
+    )
+
+# Per-table change markers, bumped by the triggers in app/versions.py
+class TableVersion(db.Model):
+    __tablename__ = 'table_versions'
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Background CSV import jobs (app/import_jobs.py)
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    bytes_total = db.Column(db.Integer, nullable=False, default=0)
+    bytes_read = db.Column(db.Integer, nullable=False, default=0)
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    rows_imported = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Text)  # JSON list of the first IMPORT_JOB_MAX_ERRORS messages
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    owner_pid = db.Column(db.Integer)  # process running the job, to reap it if that process dies
+    heartbeat_at = db.Column(db.DateTime)  # bumped with every committed batch
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        end = self.finished_at or datetime.utcnow()
+        elapsed = (end - self.started_at).total_seconds() if self.started_at else None
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status,
+            'bytes_total': self.bytes_total,
+            'bytes_read': self.bytes_read,
+            'progress': round(self.bytes_read / self.bytes_total, 4) if self.bytes_total else None,
+            'rows_processed': self.rows_processed,
+            'rows_imported': self.rows_imported,
+            'rows_per_sec': round(self.rows_processed / elapsed, 1) if elapsed else None,
+            'error_count': self.error_count,
+            'errors': json.loads(self.errors) if self.errors else [],
+            'cancel_requested': self.cancel_requested,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,116 @@
+"""
+Cross-tab counts of data entries over two dimensions (GET /stats/pivot).
+
+The grouped counts come from a single GROUP BY over the integer dimension ids
+(company_id and the dictionary ids). For company x data_set and company x
+device_type without filters the rollup tables answer instead. The groups are
+then pivoted into a dense matrix with row and column totals. Only the top N rows
+and columns by total are kept. The rest are folded into a trailing "other"
+bucket, so the response stays bounded however many values a dimension has.
+"""
+from sqlalchemy import func, select
+from app.models.models import Company, CompanyDataSetCount, CompanyDeviceTypeCount, DataEntry
+from app.database import db
+from app.dictionary import DICTIONARY_COLUMNS, lookup_value
+
+DIMENSIONS = ['company'] + list(DICTIONARY_COLUMNS)
+OTHER = '(other)'
+
+# Dimension pairs the rollup tables can answer: {dimensions} -> (table, value id column)
+_ROLLUPS = {
+    frozenset(['company', 'data_set']): (CompanyDataSetCount, CompanyDataSetCount.data_set_id),
+    frozenset(['company', 'device_type']): (CompanyDeviceTypeCount, CompanyDeviceTypeCount.device_type_id),
+}
+
+
+def _id_column(dimension):
+    return DataEntry.company_id if dimension == 'company' else getattr(DataEntry, f'{dimension}_id')
+
+
+def parse_filters(raw_filters):
+    """['data_set:prod', 'device_type:sensor', 'data_set:test'] -> {dimension: [values]}"""
+    filters = {}
+    for raw in raw_filters:
+        dimension, separator, value = raw.partition(':')
+        if not separator or dimension not in DIMENSIONS:
+            raise ValueError(f"filter must look like '<dimension>:<value>' with dimension one of {DIMENSIONS}")
+        filters.setdefault(dimension, []).append(value)
+    return filters
+
+
+def _where(dimension, values):
+    if dimension == 'company':
+        ids = select(Company.id).where(Company.name.in_(values))
+    else:
+        model = DICTIONARY_COLUMNS[dimension]
+        ids = select(model.id).where(model.value.in_(values))
+    return _id_column(dimension).in_(ids)
+
+
+def pivot_counts(rows, cols, filters):
+    """[(row id, col id, count)] in one grouped query"""
+    rollup = _ROLLUPS.get(frozenset([rows, cols]))
+    if rollup and not filters:
+        table, value_id = rollup
+        columns = {'company': table.company_id, rows if rows != 'company' else cols: value_id}
+        stmt = select(columns[rows], columns[cols], func.sum(table.count)).group_by(columns[rows], columns[cols])
+    else:
+        row_id, col_id = _id_column(rows), _id_column(cols)
+        stmt = select(row_id, col_id, func.count()).group_by(row_id, col_id)
+        for dimension, values in filters.items():
+            stmt = stmt.where(_where(dimension, values))
+    return db.session.execute(stmt).all()
+
+
+def _labels(dimension, ids):
+    if dimension == 'company':
+        names = dict(db.session.execute(select(Company.id, Company.name).where(Company.id.in_(list(ids)))).all())
+        return {value_id: names.get(value_id) for value_id in ids}
+    return {value_id: lookup_value(dimension, value_id) for value_id in ids}
+
+
+def _top(totals, labels, limit):
+    """Keys ordered by total (then label), and the keys folded into the other bucket"""
+    ordered = sorted(totals, key=lambda key: (-totals[key], labels[key] is not None, labels[key] or ''))
+    return ordered[:limit], ordered[limit:]
+
+
+def build_pivot(rows, cols, filters, rows_top, cols_top):
+    counts = pivot_counts(rows, cols, filters)
+
+    row_totals, col_totals = {}, {}
+    for row_id, col_id, count in counts:
+        row_totals[row_id] = row_totals.get(row_id, 0) + count
+        col_totals[col_id] = col_totals.get(col_id, 0) + count
+
+    row_labels = _labels(rows, row_totals)
+    col_labels = _labels(cols, col_totals)
+    row_keys, other_rows = _top(row_totals, row_labels, rows_top)
+    col_keys, other_cols = _top(col_totals, col_labels, cols_top)
+
+    row_index = {key: index for index, key in enumerate(row_keys)}
+    col_index = {key: index for index, key in enumerate(col_keys)}
+    if other_rows:
+        row_index.update({key: len(row_keys) for key in other_rows})
+    if other_cols:
+        col_index.update({key: len(col_keys) for key in other_cols})
+
+    height = len(row_keys) + (1 if other_rows else 0)
+    width = len(col_keys) + (1 if other_cols else 0)
+    matrix = [[0] * width for _ in range(height)]
+    for row_id, col_id, count in counts:
+        matrix[row_index[row_id]][col_index[col_id]] += count
+
+    return {
+        'rows_dimension': rows,
+        'cols_dimension': cols,
+        'filters': filters,
+        'rows': [row_labels[key] for key in row_keys] + ([OTHER] if other_rows else []),
+        'cols': [col_labels[key] for key in col_keys] + ([OTHER] if other_cols else []),
+        'matrix': matrix,
+        'row_totals': [sum(line) for line in matrix],
+        'col_totals': [sum(line[index] for line in matrix) for index in range(width)],
+        'total': sum(row_totals.values()),
+        'other_rows': len(other_rows),
+        'other_cols': len(other_cols),
+    }
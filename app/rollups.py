@@ -0,0 +1,111 @@
+"""
+Per-company count rollups for the /stats endpoints.
+
+company_data_set_counts and company_device_type_counts hold one row per
+(company, value) group. SQLite triggers on data_entries keep them up to date inside
+the same transaction as every insert, update and delete - including the bulk
+executemany INSERTs from app.bulk_import and app.ingest - so the stats endpoints
+read O(groups) rows instead of scanning data_entries. Groups are keyed on the
+dictionary ids (app/dictionary.py); the stats endpoints join in the names.
+
+entry_hourly_counts and entry_daily_counts are time-bucketed the same way: one
+row per (company, data_set, bucket start) where the bucket start is created_at
+truncated to the hour or day, as UTC epoch seconds. They back /stats/timeseries.
+
+NULL values are grouped with `IS` so they keep their own bucket.
+"""
+from sqlalchemy import event, text
+from app.models.models import CompanyDataSetCount, CompanyDeviceTypeCount, EntryDailyCount, EntryHourlyCount
+from app.database import db
+
+
+def _bucket_start(seconds):
+    return f"(CAST(strftime('%s', {{row}}.created_at) AS INTEGER) / {seconds}) * {seconds}"
+
+
+# (rollup table, {group column: expression over the data_entries row})
+ROLLUPS = [
+    ('company_data_set_counts', {'company_id': '{row}.company_id', 'data_set_id': '{row}.data_set_id'}),
+    ('company_device_type_counts', {'company_id': '{row}.company_id', 'device_type_id': '{row}.device_type_id'}),
+]
+
+# Bucket sizes in seconds of the time-series rollups
+TIME_BUCKETS = {'hour': 3600, 'day': 86400}
+
+TIME_ROLLUPS = [
+    (table, {'company_id': '{row}.company_id', 'data_set_id': '{row}.data_set_id',
+             'bucket_start': _bucket_start(TIME_BUCKETS[bucket])})
+    for table, bucket in (('entry_hourly_counts', 'hour'), ('entry_daily_counts', 'day'))
+]
+
+
+def _matches(keys, row):
+    return ' AND '.join(f'{column} IS {expression.format(row=row)}' for column, expression in keys.items())
+
+
+def _increment(table, keys, row):
+    return f'''
+    INSERT INTO {table} ({', '.join(keys)}, count)
+    SELECT {', '.join(expression.format(row=row) for expression in keys.values())}, 0
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {table} WHERE {_matches(keys, row)}
+    );
+    UPDATE {table} SET count = count + 1
+    WHERE {_matches(keys, row)};'''
+
+
+def _decrement(table, keys, row):
+    return f'''
+    UPDATE {table} SET count = count - 1
+    WHERE {_matches(keys, row)};
+    DELETE FROM {table}
+    WHERE {_matches(keys, row)} AND count <= 0;'''
+
+
+def _trigger(name, timing, body):
+    return f'CREATE TRIGGER IF NOT EXISTS {name} {timing} ON data_entries\nBEGIN{body}\nEND'
+
+
+def _triggers(prefix, rollups, update_columns):
+    return [
+        _trigger(f'{prefix}_insert', 'AFTER INSERT',
+                 ''.join(_increment(table, keys, 'NEW') for table, keys in rollups)),
+        _trigger(f'{prefix}_delete', 'AFTER DELETE',
+                 ''.join(_decrement(table, keys, 'OLD') for table, keys in rollups)),
+        _trigger(f'{prefix}_update', f"AFTER UPDATE OF {', '.join(update_columns)}",
+                 ''.join(_decrement(table, keys, 'OLD') + _increment(table, keys, 'NEW')
+                         for table, keys in rollups)),
+    ]
+
+
+ROLLUP_TRIGGERS = (
+    _triggers('trg_rollup', ROLLUPS, ['company_id', 'data_set_id', 'device_type_id'])
+    + _triggers('trg_time_rollup', TIME_ROLLUPS, ['company_id', 'data_set_id', 'created_at'])
+)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_triggers(target, connection, **kw):
+    for trigger_sql in ROLLUP_TRIGGERS:
+        connection.exec_driver_sql(trigger_sql)
+
+
+def rebuild_rollups():
+    """
+    Create any missing rollup tables/triggers and recompute every count from
+    data_entries in one transaction. Use it to repair or backfill the rollups.
+    """
+    tables = [CompanyDataSetCount.__table__, CompanyDeviceTypeCount.__table__,
+              EntryHourlyCount.__table__, EntryDailyCount.__table__]
+    db.metadata.create_all(bind=db.engine, tables=tables)
+
+    with db.engine.begin() as connection:
+        for trigger_sql in ROLLUP_TRIGGERS:
+            connection.exec_driver_sql(trigger_sql)
+        for table, keys in ROLLUPS + TIME_ROLLUPS:
+            expressions = ', '.join(expression.format(row='data_entries') for expression in keys.values())
+            connection.execute(text(f'DELETE FROM {table}'))
+            connection.execute(text(
+                f"INSERT INTO {table} ({', '.join(keys)}, count) "
+                f'SELECT {expressions}, COUNT(*) FROM data_entries GROUP BY {expressions}'
+            ))
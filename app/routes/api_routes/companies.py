@@ -1,19 +1,36 @@
 from flask import Blueprint, request, jsonify
 from app.models.models import Company
 from app.database import db
+from app.cache import bump_data_generation, cached_response
+from app.versions import etag_response
+from app.serializers import (
+    COMPANY_FIELDS, RESPONSE_FORMATS, columnar, companies_select, fetch_rows, parse_fields, serialize_companies
+)
 
 bp = Blueprint('companies', __name__, url_prefix='/companies')
 
 # API Routes
 def fetch_companies():
-    companies = Company.query.all()
-    return [company.to_dict() for company in companies]
+    return serialize_companies()
 
+# GET all companies; ?fields=id,name projects columns, ?format=columnar sends one array per column
 @bp.route('', methods=['GET'])
+@etag_response('companies')
+@cached_response
 def get_companies():
     """Get all companies"""
+    fmt = request.args.get('format', 'rows')
+    if fmt not in RESPONSE_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(RESPONSE_FORMATS)}"}), 400
     try:
-        return jsonify(fetch_companies())
+        fields = parse_fields(request.args.get('fields'), COMPANY_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        if fmt == 'columnar':
+            return jsonify(columnar(*fetch_rows(companies_select(fields))))
+        return jsonify(serialize_companies(fields))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -36,6 +53,7 @@ def create_company():
         company = Company(name=data['name'])
         db.session.add(company)
         db.session.commit()
+        bump_data_generation()
         
         # return jsonify(company.to_dict()), 201
         return jsonify({
@@ -51,6 +69,7 @@ def create_company():
     
 
 @bp.route('/<int:company_id>', methods=['GET'])
+@etag_response('companies')
 def get_company(company_id):
     """Get a specific company"""
     company = Company.query.get_or_404(company_id)
@@ -66,6 +85,7 @@ def delete_company(company_id):
         # Due to CASCADE, related data entries will be deleted automatically
         db.session.delete(company)
         db.session.commit()
+        bump_data_generation()
         
         return jsonify({'message': 'Company deleted successfully'})
     
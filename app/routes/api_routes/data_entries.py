@@ -1,12 +1,27 @@
-from flask import Blueprint, request, jsonify
-from app.models.models import Company, DataEntry
+from flask import Blueprint, Response, abort, current_app, request, jsonify, stream_with_context, url_for
+from app.models.models import Company, DataEntry, ImportJob
 from app.database import db
+from app.bulk_import import (
+    bulk_import_rows, batch_create_entries, batch_update_entries, batch_delete_entries, field_type_error
+)
+from app.cache import bump_data_generation
+from app.import_jobs import ImportJobsShuttingDown, TooManyImportJobs, cancel_import_job, submit_import_job
+from app.export import arrow_available, export_select, generate_arrow, generate_csv
+from app.search import SEARCH_COLUMNS, build_match_expression, search_select
+from app.versions import etag_response
+from app.serializers import (
+    COLUMNAR_CODES, ENTRY_FIELDS, RESPONSE_FORMATS, columnar, data_entries_select, fetch_rows,
+    filter_data_entries, iter_dicts, parse_fields, serialize_data_entries, serialize_data_entry
+)
+from config import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_WRITE_BATCH_SIZE, STREAM_BATCH_SIZE
 from sqlalchemy import func
 import csv
 import io
 
 bp = Blueprint('data_entries', __name__, url_prefix='/data-entries')
 
+STRING_FIELDS = ['device_type', 'uid', 'data_type', 'data_set', 'data_going_to']
+
 
 def create_data_entry_from_dict(data):
     required_fields = ['company_id', 'uid']
@@ -14,6 +29,11 @@ def create_data_entry_from_dict(data):
         if not data or field not in data:
             return {'error': f'{field} is required'}, 400
 
+    # Dictionary fields are looked up by value, so anything but a string would miss
+    type_error = field_type_error(data, STRING_FIELDS)
+    if type_error:
+        return {'error': type_error}, 400
+
     company = Company.query.get(data['company_id'])
     if not company:
         return {'error': 'Company not found'}, 404
@@ -33,6 +53,7 @@ def create_data_entry_from_dict(data):
 
     db.session.add(data_entry)
     db.session.commit()
+    bump_data_generation()
 
     return data_entry.to_dict(), 201
 
@@ -50,61 +71,279 @@ def upload_csv():
     if not file.filename.endswith('.csv'):
         return jsonify({'error': 'File is not a CSV'}), 400
 
+    # ?async=true spools the file and imports it in a background job
+    if request.args.get('async', 'false').lower() in ('1', 'true', 'yes'):
+        try:
+            job = submit_import_job(current_app._get_current_object(), file)
+        except TooManyImportJobs as e:
+            return jsonify({'error': str(e)}), 429
+        except ImportJobsShuttingDown as e:
+            return jsonify({'error': str(e)}), 503
+        response = jsonify(job.to_dict())
+        response.status_code = 202
+        response.headers['Location'] = url_for('data_entries.get_import_job', job_id=job.id)
+        return response
+
     try:
         stream = io.StringIO(file.stream.read().decode('utf-8'))
         reader = csv.DictReader(stream)
 
-        imported = 0
-        errors = []
+        result = bulk_import_rows(reader)
+        bump_data_generation()
 
-        for row in reader:
-            try:
-                print("Processing row:", row)
+        return jsonify({
+            'message': f"Imported {result['imported']} entries.",
+            'imported': result['imported'],
+            'errors': result['errors'],
+            'rows_per_sec': result['rows_per_sec']
+        })
 
-                if 'company' in row and not row.get('company_id'):
-                    company = Company.query.filter_by(name=row['company'].strip()).first()
-                    if not company:
-                        raise ValueError(f"Company '{row['company']}' not found")
-                    row['company_id'] = company.id
+    except Exception as e:
+        return jsonify({'error': f'Failed to process file: {str(e)}'}), 500
 
-                response, status = create_data_entry_from_dict(row)
-                print("Response:", response, "Status:", status)
 
-                if status == 201:
-                    imported += 1
-                else:
-                    errors.append(response['error'])
+def stream_data_entries(stmt, fmt):
+    """Stream rows from a server-side cursor as NDJSON or a chunked JSON array"""
+    stmt = stmt.order_by(DataEntry.id)
+    dumps = current_app.json.dumps
 
-            except Exception as e:
-                errors.append(str(e))
+    def generate_ndjson():
+        for entry in iter_dicts(stmt, STREAM_BATCH_SIZE):
+            yield dumps(entry) + '\n'
+
+    def generate_json_array():
+        yield '['
+        separator = ''
+        for entry in iter_dicts(stmt, STREAM_BATCH_SIZE):
+            yield separator + dumps(entry)
+            separator = ','
+        yield ']'
+
+    if fmt == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(generate_json_array()), mimetype='application/json')
+
+
+def _int_arg(name):
+    """Integer query parameter, None when absent; ValueError rather than silently dropping a bad value"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an integer')
+
+
+# GET recent background import jobs
+@bp.route('/import-jobs', methods=['GET'])
+def list_import_jobs():
+    jobs = ImportJob.query.order_by(ImportJob.created_at.desc()).limit(50).all()
+    return jsonify([job.to_dict() for job in jobs])
+
+
+# GET status, progress, throughput and errors of a background import job
+@bp.route('/import-jobs/<job_id>', methods=['GET'])
+def get_import_job(job_id):
+    job = db.get_or_404(ImportJob, job_id)
+    return jsonify(job.to_dict())
 
-        return jsonify({
-            'message': f'Imported {imported} entries.',
-            'errors': errors
-        })
 
+# DELETE cancels a queued or running import job
+@bp.route('/import-jobs/<job_id>', methods=['DELETE'])
+def cancel_import(job_id):
+    try:
+        job = cancel_import_job(db.get_or_404(ImportJob, job_id))
+        return jsonify(job.to_dict()), 202
     except Exception as e:
-        return jsonify({'error': f'Failed to process file: {str(e)}'}), 500
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
 
 # GET all data entries (optionally filtered)
+# ?after_id=&limit= switches to keyset pagination, ?stream=ndjson|json streams every row
+# ?fields=id,uid,data_set projects columns, ?format=columnar sends one array per column
 @bp.route('', methods=['GET'])
+@etag_response('companies', 'data_entries')
 def get_data_entries():
-    company_name = request.args.get('company_name')
-    uid = request.args.get('uid')
-    data_set = request.args.get('data_set')
-
-    query = DataEntry.query.join(Company)
+    try:
+        after_id = _int_arg('after_id')
+        limit = _int_arg('limit')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be at least 1'}), 400
+    stream = request.args.get('stream')
+    fmt = request.args.get('format', 'rows')
+    if fmt not in RESPONSE_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(RESPONSE_FORMATS)}"}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'), ENTRY_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    paginated = after_id is not None or limit is not None
+    # Keyset pagination needs the id of the last row even when it was not asked for
+    select_fields = ['id'] + fields if paginated and fields and 'id' not in fields else fields
+
+    stmt = filter_data_entries(
+        data_entries_select(select_fields, codes=fmt == 'columnar'),
+        company_name=request.args.get('company_name'),
+        uid=request.args.get('uid'),
+        data_set=request.args.get('data_set')
+    )
+    if after_id is not None:
+        stmt = stmt.where(DataEntry.id > after_id)
+
+    if stream:
+        if stream not in ('ndjson', 'json'):
+            return jsonify({'error': 'stream must be ndjson or json'}), 400
+        if fmt == 'columnar':
+            return jsonify({'error': 'format=columnar cannot be streamed'}), 400
+        return stream_data_entries(stmt, stream)
+
+    if not paginated:
+        if fmt == 'columnar':
+            return jsonify(columnar(*fetch_rows(stmt), coded=COLUMNAR_CODES))
+        return jsonify(serialize_data_entries(stmt))
+
+    limit = min(DEFAULT_PAGE_SIZE if limit is None else limit, MAX_PAGE_SIZE)
+    # Fetch one extra row to know whether another page exists
+    keys, rows = fetch_rows(stmt.order_by(DataEntry.id).limit(limit + 1))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_after_id = rows[-1][keys.index('id')] if has_more else None
+    if select_fields is not fields:
+        keys, rows = keys[1:], [row[1:] for row in rows]
+
+    if fmt == 'columnar':
+        data_entries = columnar(keys, rows, coded=COLUMNAR_CODES)
+    else:
+        data_entries = [dict(zip(keys, row)) for row in rows]
+
+    return jsonify({
+        'data_entries': data_entries,
+        'limit': limit,
+        'next_after_id': next_after_id
+    })
+
+
+def _batch_payload(key):
+    """Read the list from a batch request body, either bare or as {key: [...]}"""
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get(key)
+    if not isinstance(data, list) or not data:
+        return None, (jsonify({'error': f'Expected a non-empty list of {key}'}), 400)
+    if len(data) > MAX_WRITE_BATCH_SIZE:
+        return None, (jsonify({'error': f'Batch exceeds the limit of {MAX_WRITE_BATCH_SIZE} items'}), 413)
+    return data, None
+
+
+def _run_batch(operation, items):
+    """Apply a batch in one transaction and report per-item results"""
+    atomic = request.args.get('atomic', 'false').lower() in ('1', 'true', 'yes')
+    try:
+        result = operation(items, atomic=atomic)
+        db.session.commit()
+        if result['succeeded']:
+            bump_data_generation()
+        return jsonify(result), (400 if not result['applied'] else 200)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
-    if company_name:
-        query = query.filter(Company.name == company_name)
-    if uid:
-        query = query.filter(DataEntry.uid == uid)
-    if data_set:
-        query = query.filter(DataEntry.data_set == data_set)
 
-    data_entries = query.all()
-    return jsonify([entry.to_dict() for entry in data_entries])
+# POST many new data entries; ?atomic=true applies all or nothing
+@bp.route('/batch', methods=['POST'])
+def create_data_entries_batch():
+    items, error = _batch_payload('entries')
+    if error:
+        return error
+    return _run_batch(batch_create_entries, items)
+
+
+# PUT updates to many data entries, each item being {id, ...fields}
+@bp.route('/batch', methods=['PUT'])
+def update_data_entries_batch():
+    items, error = _batch_payload('entries')
+    if error:
+        return error
+    return _run_batch(batch_update_entries, items)
+
+
+# DELETE many data entries by id
+@bp.route('/batch', methods=['DELETE'])
+def delete_data_entries_batch():
+    ids, error = _batch_payload('ids')
+    if error:
+        return error
+    return _run_batch(batch_delete_entries, ids)
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+# GET a streamed export in the upload-csv column layout (?format=csv|parquet|arrow)
+# Takes the same filters as GET /data-entries plus device_type
+@bp.route('/export', methods=['GET'])
+@etag_response('companies', 'data_entries')
+def export_data_entries():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt != 'csv' and not arrow_available():
+        return jsonify({'error': f'{fmt} export requires the pyarrow package'}), 501
+
+    stmt = export_select(
+        company_name=request.args.get('company_name'),
+        uid=request.args.get('uid'),
+        data_set=request.args.get('data_set'),
+        device_type=request.args.get('device_type')
+    )
+    body = generate_csv(stmt) if fmt == 'csv' else generate_arrow(stmt, fmt)
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=data_entries.{extension}'
+    return response
+
+
+# GET full-text search over uid, data_set, data_type, device_type and data_going_to
+# ?q=xyz_sensor analytics [&field=uid] [&mode=prefix|term] [&limit=&offset=]
+@bp.route('/search', methods=['GET'])
+@etag_response('companies', 'data_entries')
+def search_entries():
+    query = request.args.get('q', '')
+    field = request.args.get('field')
+    mode = request.args.get('mode', 'prefix')
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    if field and field not in SEARCH_COLUMNS:
+        return jsonify({'error': f"field must be one of {', '.join(SEARCH_COLUMNS)}"}), 400
+    if mode not in ('prefix', 'term'):
+        return jsonify({'error': 'mode must be prefix or term'}), 400
+
+    expression = build_match_expression(query, field=field, prefix=(mode == 'prefix'))
+    if expression is None:
+        return jsonify({'error': 'q parameter is required'}), 400
+
+    # Fetch one extra row to know whether another page exists
+    data_entries = serialize_data_entries(search_select(expression, limit + 1, offset))
+    has_more = len(data_entries) > limit
+
+    return jsonify({
+        'query': expression,
+        'data_entries': data_entries[:limit],
+        'limit': limit,
+        'offset': offset,
+        'next_offset': offset + limit if has_more else None
+    })
 
 
 # POST a new data entry
@@ -117,9 +356,12 @@ def create_data_entry():
 
 # GET a specific data entry
 @bp.route('/<int:entry_id>', methods=['GET'])
+@etag_response('companies', 'data_entries')
 def get_data_entry(entry_id):
-    data_entry = DataEntry.query.get_or_404(entry_id)
-    return jsonify(data_entry.to_dict())
+    data_entry = serialize_data_entry(entry_id)
+    if data_entry is None:
+        abort(404)
+    return jsonify(data_entry)
 
 
 # PUT update a data entry
@@ -131,6 +373,10 @@ def update_data_entry(entry_id):
     if not data:
         return jsonify({'error': 'No data provided'}), 400
 
+    type_error = field_type_error(data, STRING_FIELDS)
+    if type_error:
+        return jsonify({'error': type_error}), 400
+
     if 'device_type' in data:
         data_entry.device_type = data['device_type']
     if 'uid' in data:
@@ -143,6 +389,7 @@ def update_data_entry(entry_id):
         data_entry.data_going_to = data['data_going_to']
 
     db.session.commit()
+    bump_data_generation()
     return jsonify(data_entry.to_dict())
 
 
@@ -154,6 +401,7 @@ def delete_data_entry(entry_id):
         entry = DataEntry.query.get_or_404(entry_id)
         db.session.delete(entry)
         db.session.commit()
+        bump_data_generation()
         return jsonify({'message': 'Data entry deleted successfully'})
     except Exception as e:
         db.session.rollback()
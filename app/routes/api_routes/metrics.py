@@ -0,0 +1,102 @@
+from flask import Blueprint, Response, jsonify, request
+from app.analytics import snapshot
+from app.cache import page_cache, response_cache
+from app.compression import compression_stats
+from app.metrics import render_prometheus
+from app.slow_queries import slow_query_log
+from config import SLOW_QUERY_THRESHOLD_MS
+
+bp = Blueprint('metrics', __name__, url_prefix='/metrics')
+
+
+def _cache_lines(prefix, cache, description):
+    stats = cache.stats()
+    return [
+        f'# HELP {prefix}_hits_total {description} cache hits.',
+        f'# TYPE {prefix}_hits_total counter',
+        f"{prefix}_hits_total {stats['hits']}",
+        f'# HELP {prefix}_misses_total {description} cache misses.',
+        f'# TYPE {prefix}_misses_total counter',
+        f"{prefix}_misses_total {stats['misses']}",
+        f'# HELP {prefix}_entries {description}s currently cached.',
+        f'# TYPE {prefix}_entries gauge',
+        f"{prefix}_entries {stats['entries']}",
+    ]
+
+
+def _analytics_lines():
+    stats = snapshot.stats()
+    return [
+        '# HELP analytics_snapshot_rows Rows held in the columnar analytics snapshot.',
+        '# TYPE analytics_snapshot_rows gauge',
+        f"analytics_snapshot_rows {stats['rows']}",
+        '# HELP analytics_snapshot_bytes Memory used by the snapshot arrays.',
+        '# TYPE analytics_snapshot_bytes gauge',
+        f"analytics_snapshot_bytes {stats['memory_bytes']}",
+        '# HELP analytics_snapshot_loads_total Snapshot refreshes by kind.',
+        '# TYPE analytics_snapshot_loads_total counter',
+        f'analytics_snapshot_loads_total{{kind="full"}} {stats["full_loads"]}',
+        f'analytics_snapshot_loads_total{{kind="incremental"}} {stats["incremental_loads"]}',
+    ]
+
+
+def _compression_lines():
+    stats = compression_stats.stats()
+    return [
+        '# HELP http_compressed_responses_total Responses compressed, by encoding.',
+        '# TYPE http_compressed_responses_total counter',
+        *[f'http_compressed_responses_total{{encoding="{encoding}"}} {count}'
+          for encoding, count in sorted(stats['responses'].items())],
+        '# HELP http_compression_skipped_total Responses left uncompressed, by reason.',
+        '# TYPE http_compression_skipped_total counter',
+        *[f'http_compression_skipped_total{{reason="{reason}"}} {count}'
+          for reason, count in sorted(stats['skipped'].items())],
+        '# HELP http_compression_input_bytes_total Bytes fed to the compressors.',
+        '# TYPE http_compression_input_bytes_total counter',
+        f"http_compression_input_bytes_total {stats['bytes_in']}",
+        '# HELP http_compression_output_bytes_total Compressed bytes sent.',
+        '# TYPE http_compression_output_bytes_total counter',
+        f"http_compression_output_bytes_total {stats['bytes_out']}",
+        '# HELP http_compression_cpu_seconds_total CPU time spent compressing.',
+        '# TYPE http_compression_cpu_seconds_total counter',
+        f"http_compression_cpu_seconds_total {stats['cpu_seconds']}",
+    ]
+
+
+# GET all metrics in Prometheus text format
+@bp.route('', methods=['GET'])
+def get_metrics():
+    return Response(render_prometheus([
+        _cache_lines('response_cache', response_cache, 'Response'),
+        _cache_lines('page_cache', page_cache, 'Page'),
+        _analytics_lines(),
+        _compression_lines(),
+    ]), mimetype='text/plain; version=0.0.4')
+
+
+# GET response and page cache hit/miss counters
+@bp.route('/cache', methods=['GET'])
+def get_cache_metrics():
+    return jsonify(dict(response_cache.stats(), pages=page_cache.stats()))
+
+
+# GET compression ratio (output/input bytes), CPU time and skip reasons in this process
+@bp.route('/compression', methods=['GET'])
+def get_compression_metrics():
+    return jsonify(compression_stats.stats())
+
+
+# GET statements over the slow-query threshold in this process, ranked by total time
+@bp.route('/slow-queries', methods=['GET'])
+def get_slow_queries():
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({
+        'threshold_ms': SLOW_QUERY_THRESHOLD_MS,
+        'statements': slow_query_log.summary(limit)
+    })
+
+
+# GET size and refresh counters of the columnar analytics snapshot
+@bp.route('/analytics', methods=['GET'])
+def get_analytics_metrics():
+    return jsonify(snapshot.stats())
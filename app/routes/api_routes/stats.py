@@ -1,29 +1,88 @@
 from flask import Blueprint, request, jsonify
-from app.models.models import Company, DataEntry
+from app.models.models import Company, CompanyDataSetCount, CompanyDeviceTypeCount, DataSet, DeviceType
 from app.database import db
-from sqlalchemy import func
+from app.cache import cached_response
+from app.versions import etag_response, varies_with
+from app.dictionary import value_id_subquery
+from app.analytics import analytics_enabled, by_value_name, decode, snapshot
+from app.pivot import DIMENSIONS, build_pivot, parse_filters
+from app.serializers import RESPONSE_FORMATS, columnar_lists
+from app.timeseries import BUCKETS, GROUP_BY, build_timeseries, parse_time, time_range
+from config import PIVOT_DEFAULT_TOP, PIVOT_MAX_TOP, TIMESERIES_DEFAULT_TOP
+from sqlalchemy import func, select
 
 bp = Blueprint('stats', __name__, url_prefix='/stats')
 
+# All counts below are read from the rollup tables maintained by app/rollups.py,
+# so each query touches one row per group rather than every data entry. Groups are
+# keyed on dictionary ids; the names are joined in from the dictionary tables.
+# With ANALYTICS_ENGINE = 'numpy' the same answers come from the in-memory
+# columnar snapshot in app/analytics.py instead.
+_data_set_join = (DataSet, DataSet.id == CompanyDataSetCount.data_set_id)
+_device_type_join = (DeviceType, DeviceType.id == CompanyDeviceTypeCount.device_type_id)
+
+
+@bp.before_request
+def _check_format():
+    fmt = request.args.get('format', 'rows')
+    if fmt not in RESPONSE_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(RESPONSE_FORMATS)}"}), 400
+
+
+# Lists of objects in the stats payloads that ?format=columnar turns into one array per
+# field, with the fields their items always have
+COLUMNAR_LISTS = {
+    'company_entry_counts': ['company', 'entries'],
+    'device_type_distribution': ['device_type', 'count'],
+    'data_set_distribution': ['data_set', 'count'],
+    'device_type_counts': ['device_type', 'count'],
+    'data_set_counts': ['data_set', 'count'],
+    'points': ['bucket_start', 'count'],
+}
+
+
+def _stats_response(payload):
+    """jsonify a stats payload; ?format=columnar turns its lists of objects into one array per key"""
+    if request.args.get('format') == 'columnar':
+        payload = columnar_lists(payload, COLUMNAR_LISTS)
+    return jsonify(payload)
+
 
 # GET stats for a specific company
 @bp.route('/company/<int:company_id>', methods=['GET'])
+@etag_response('companies', 'data_entries')
+@cached_response
 def get_company_stats(company_id):
     company = Company.query.get_or_404(company_id)
 
-    total_entries = DataEntry.query.filter_by(company_id=company_id).count()
+    if analytics_enabled():
+        snapshot.refresh()
+        data_set_counts = by_value_name([
+            (decode('data_set', code), count)
+            for _, code, count in snapshot.company_counts('data_set', [company_id])
+        ])
+        device_type_counts = by_value_name([
+            (decode('device_type', code), count)
+            for _, code, count in snapshot.company_counts('device_type', [company_id])
+        ])
+    else:
+        data_set_counts = db.session.query(
+            DataSet.value,
+            CompanyDataSetCount.count
+        ).outerjoin(*_data_set_join).filter(
+            CompanyDataSetCount.company_id == company_id
+        ).order_by(DataSet.value).all()
 
-    data_set_counts = db.session.query(
-        DataEntry.data_set,
-        func.count(DataEntry.id).label('count')
-    ).filter_by(company_id=company_id).group_by(DataEntry.data_set).all()
+        device_type_counts = db.session.query(
+            DeviceType.value,
+            CompanyDeviceTypeCount.count
+        ).outerjoin(*_device_type_join).filter(
+            CompanyDeviceTypeCount.company_id == company_id
+        ).order_by(DeviceType.value).all()
 
-    device_type_counts = db.session.query(
-        DataEntry.device_type,
-        func.count(DataEntry.id).label('count')
-    ).filter_by(company_id=company_id).group_by(DataEntry.device_type).all()
+    total_entries = sum(count for _, count in data_set_counts)
 
-    return jsonify({
+    return _stats_response({
         'company': company.to_dict(),
         'total_entries': total_entries,
         'data_set_counts': [{'data_set': ds, 'count': count} for ds, count in data_set_counts],
@@ -31,8 +90,75 @@ def get_company_stats(company_id):
     })
 
 
+# GET stats for many companies at once: ?ids=1,2,3 or ?ids=all
+# Three grouped queries in total, however many companies are requested
+@bp.route('/companies', methods=['GET'])
+@etag_response('companies', 'data_entries')
+@cached_response
+def get_companies_stats():
+    ids_param = request.args.get('ids', 'all')
+
+    company_query = Company.query
+    data_set_query = db.session.query(
+        CompanyDataSetCount.company_id, DataSet.value, CompanyDataSetCount.count
+    ).outerjoin(*_data_set_join)
+    device_type_query = db.session.query(
+        CompanyDeviceTypeCount.company_id, DeviceType.value, CompanyDeviceTypeCount.count
+    ).outerjoin(*_device_type_join)
+
+    requested_ids = None
+    if ids_param != 'all':
+        try:
+            requested_ids = sorted({int(value) for value in ids_param.split(',') if value.strip()})
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma-separated list of integers or "all"'}), 400
+        company_query = company_query.filter(Company.id.in_(requested_ids))
+        data_set_query = data_set_query.filter(CompanyDataSetCount.company_id.in_(requested_ids))
+        device_type_query = device_type_query.filter(CompanyDeviceTypeCount.company_id.in_(requested_ids))
+
+    results = {
+        company.id: {
+            'company': company.to_dict(),
+            'total_entries': 0,
+            'data_set_counts': [],
+            'device_type_counts': []
+        }
+        for company in company_query.all()
+    }
+
+    if analytics_enabled():
+        snapshot.refresh()
+        data_set_rows = by_value_name([
+            (company_id, decode('data_set', code), count)
+            for company_id, code, count in snapshot.company_counts('data_set', requested_ids)
+        ], position=1)
+        device_type_rows = by_value_name([
+            (company_id, decode('device_type', code), count)
+            for company_id, code, count in snapshot.company_counts('device_type', requested_ids)
+        ], position=1)
+    else:
+        data_set_rows = data_set_query.order_by(DataSet.value)
+        device_type_rows = device_type_query.order_by(DeviceType.value)
+
+    for company_id, data_set, count in data_set_rows:
+        if company_id in results:
+            results[company_id]['data_set_counts'].append({'data_set': data_set, 'count': count})
+            results[company_id]['total_entries'] += count
+
+    for company_id, device_type, count in device_type_rows:
+        if company_id in results:
+            results[company_id]['device_type_counts'].append({'device_type': device_type, 'count': count})
+
+    return _stats_response({
+        'companies': {str(company_id): stats for company_id, stats in results.items()},
+        'missing_ids': [company_id for company_id in requested_ids or [] if company_id not in results]
+    })
+
+
 # GET count of entries by company name and data_set
 @bp.route('/data-set-count', methods=['GET'])
+@etag_response('companies', 'data_entries')
+@cached_response
 def get_data_set_count():
     company_name = request.args.get('company_name')
     data_set = request.args.get('data_set')
@@ -40,10 +166,19 @@ def get_data_set_count():
     if not company_name or not data_set:
         return jsonify({'error': 'company_name and data_set parameters are required'}), 400
 
-    count = db.session.query(func.count(DataEntry.id)).join(Company).filter(
-        Company.name == company_name,
-        DataEntry.data_set == data_set
-    ).scalar()
+    if analytics_enabled():
+        snapshot.refresh()
+        company_id = db.session.scalar(select(Company.id).where(Company.name == company_name))
+        data_set_id = db.session.scalar(select(DataSet.id).where(DataSet.value == data_set))
+        count = 0
+        if company_id is not None and data_set_id is not None:
+            count = sum(n for _, code, n in snapshot.company_counts('data_set', [company_id])
+                        if code == data_set_id)
+    else:
+        count = db.session.query(func.coalesce(func.sum(CompanyDataSetCount.count), 0)).join(Company).filter(
+            Company.name == company_name,
+            CompanyDataSetCount.data_set_id == value_id_subquery('data_set', data_set)
+        ).scalar()
 
     return jsonify({
         'company_name': company_name,
@@ -52,33 +187,118 @@ def get_data_set_count():
     })
 
 
+# GET cross-tab counts: ?rows=company&cols=data_set&filter=device_type:sensor&rows_top=20&cols_top=20
+@bp.route('/pivot', methods=['GET'])
+@etag_response('companies', 'data_entries')
+@cached_response
+def get_pivot():
+    rows = request.args.get('rows')
+    cols = request.args.get('cols')
+    if rows not in DIMENSIONS or cols not in DIMENSIONS or rows == cols:
+        return jsonify({'error': f'rows and cols must be two different dimensions out of {DIMENSIONS}'}), 400
+
+    try:
+        filters = parse_filters(request.args.getlist('filter'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    rows_top = request.args.get('rows_top', PIVOT_DEFAULT_TOP, type=int)
+    cols_top = request.args.get('cols_top', PIVOT_DEFAULT_TOP, type=int)
+    if not (1 <= rows_top <= PIVOT_MAX_TOP and 1 <= cols_top <= PIVOT_MAX_TOP):
+        return jsonify({'error': f'rows_top and cols_top must be between 1 and {PIVOT_MAX_TOP}'}), 400
+
+    try:
+        return jsonify(build_pivot(rows, cols, filters, rows_top, cols_top))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _timeseries_window():
+    """Without an end the range runs up to now, so cached answers are keyed on the resolved range"""
+    bucket = request.args.get('bucket', 'day')
+    if 'end' in request.args or bucket not in BUCKETS:
+        return None
+    try:
+        start = parse_time(request.args['start']) if 'start' in request.args else None
+        return time_range(bucket, start)
+    except ValueError:
+        return None  # the view answers 400
+
+
+# GET entry counts per time bucket: ?bucket=hour|day|week&start=2024-01-01&end=2024-04-01
+# optionally for one company (company_id or company_name) and/or data_set,
+# or split into one series per company or data_set with group_by=company|data_set&top=10
+@bp.route('/timeseries', methods=['GET'])
+@varies_with(_timeseries_window)
+@etag_response('companies', 'data_entries')
+@cached_response
+def get_timeseries():
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return jsonify({'error': f'bucket must be one of {list(BUCKETS)}'}), 400
+
+    group_by = request.args.get('group_by')
+    if group_by is not None and group_by not in GROUP_BY:
+        return jsonify({'error': f'group_by must be one of {GROUP_BY}'}), 400
+
+    top = request.args.get('top', TIMESERIES_DEFAULT_TOP, type=int)
+    if not 1 <= top <= PIVOT_MAX_TOP:
+        return jsonify({'error': f'top must be between 1 and {PIVOT_MAX_TOP}'}), 400
+
+    try:
+        start = parse_time(request.args['start']) if 'start' in request.args else None
+        end = parse_time(request.args['end']) if 'end' in request.args else None
+        start, end = time_range(bucket, start, end)
+    except ValueError as e:
+        return jsonify({'error': f'invalid time range: {e}'}), 400
+
+    company_id = request.args.get('company_id', type=int)
+    company_name = request.args.get('company_name')
+    if company_id is None and company_name:
+        company_id = db.session.scalar(select(Company.id).where(Company.name == company_name))
+        if company_id is None:
+            return jsonify({'error': f'company {company_name!r} not found'}), 404
+
+    try:
+        return _stats_response(build_timeseries(bucket, start, end, company_id, request.args.get('data_set'),
+                                                group_by, top))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @bp.route('', methods=['GET'])  
+@etag_response('companies', 'data_entries')
+@cached_response
 def get_all_company_stats():
     """Get statistics about companies and data entries"""
     try:
         # Basic statistics
         total_companies = Company.query.count()
-        total_entries = DataEntry.query.count()
         
+        if analytics_enabled():
+            return _stats_response(_snapshot_overview(total_companies))
+
         # Company with most entries
         company_entry_counts = db.session.query(
             Company.name,
-            func.count(DataEntry.id).label('entry_count')
-        ).join(DataEntry).group_by(Company.id, Company.name).order_by(
-            func.count(DataEntry.id).desc()
+            func.sum(CompanyDataSetCount.count).label('entry_count')
+        ).join(CompanyDataSetCount).group_by(Company.id, Company.name).order_by(
+            func.sum(CompanyDataSetCount.count).desc()
         ).all()
+
+        total_entries = sum(count for _, count in company_entry_counts)
         
         # Device type distribution
         device_type_counts = db.session.query(
-            DataEntry.device_type,
-            func.count(DataEntry.id).label('count')
-        ).group_by(DataEntry.device_type).all()
+            DeviceType.value,
+            func.sum(CompanyDeviceTypeCount.count).label('count')
+        ).outerjoin(*_device_type_join).group_by(CompanyDeviceTypeCount.device_type_id).order_by(DeviceType.value).all()
         
         # Data set distribution
         data_set_counts = db.session.query(
-            DataEntry.data_set,
-            func.count(DataEntry.id).label('count')
-        ).group_by(DataEntry.data_set).all()
+            DataSet.value,
+            func.sum(CompanyDataSetCount.count).label('count')
+        ).outerjoin(*_data_set_join).group_by(CompanyDataSetCount.data_set_id).order_by(DataSet.value).all()
         
         stats_data = {
             'total_companies': total_companies,
@@ -97,8 +317,38 @@ def get_all_company_stats():
             ]
         }
         
-        return jsonify(stats_data)
+        return _stats_response(stats_data)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+def _snapshot_overview(total_companies):
+    """The GET /stats payload computed from the columnar snapshot"""
+    snapshot.refresh()
+    entry_counts = snapshot.company_totals()
+    names = dict(db.session.query(Company.id, Company.name).filter(Company.id.in_(list(entry_counts))))
+    company_entry_counts = sorted(
+        ((names[company_id], count) for company_id, count in entry_counts.items() if company_id in names),
+        key=lambda row: row[1], reverse=True
+    )
+    device_type_counts = by_value_name([(decode('device_type', code), count)
+                                        for code, count in snapshot.totals('device_type')])
+    data_set_counts = by_value_name([(decode('data_set', code), count)
+                                     for code, count in snapshot.totals('data_set')])
+    return {
+        'total_companies': total_companies,
+        'total_entries': sum(count for _, count in company_entry_counts),
+        'company_entry_counts': [
+            {'company': name, 'entries': count}
+            for name, count in company_entry_counts
+        ],
+        'device_type_distribution': [
+            {'device_type': device_type or 'Unknown', 'count': count}
+            for device_type, count in device_type_counts
+        ],
+        'data_set_distribution': [
+            {'data_set': data_set or 'Unknown', 'count': count}
+            for data_set, count in data_set_counts
+        ]
+    }
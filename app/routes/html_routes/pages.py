@@ -1,23 +1,26 @@
 from flask import request, Blueprint, render_template
-from app.routes.api_routes.companies import get_companies, fetch_companies
-from app.routes.api_routes.data_entries import get_data_entry, get_data_entries
-from app.routes.api_routes.stats import get_company_stats
+from app.cache import cached_page
 
 
 pages_bp = Blueprint('pages', __name__, url_prefix='/pages')
 
 
+# The pages are static shells that load their data from the API, so their cached
+# HTML only changes with the asset build
+
 @pages_bp.route('/companies')
+@cached_page()
 def show_companies():
-    return render_template('pages/companies_page.html', active_page='companies', companies=get_companies())
+    return render_template('pages/companies_page.html', active_page='companies')
 
 
 @pages_bp.route('/data-entries')
+@cached_page()
 def show_data_entries():
-    return render_template('pages/data_entries_page.html', active_page='data_entries', entries=get_companies())
+    return render_template('pages/data_entries_page.html', active_page='data_entries')
 
 
 @pages_bp.route('/statistics')
+@cached_page()
 def show_statistics():
-    return render_template('pages/statistics_page.html', active_page='statistics', companies=fetch_companies())
-
+    return render_template('pages/statistics_page.html', active_page='statistics')
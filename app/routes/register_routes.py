@@ -1,6 +1,7 @@
 from .api_routes.companies import bp as companies_bp
 from .api_routes.data_entries import bp as data_entries_bp
 from .api_routes.stats import bp as stats_bp
+from .api_routes.metrics import bp as metrics_bp
 from .html_routes.pages import pages_bp
 
 def register_routes(app):
@@ -8,6 +9,7 @@ def register_routes(app):
     app.register_blueprint(companies_bp)
     app.register_blueprint(data_entries_bp)
     app.register_blueprint(stats_bp)
+    app.register_blueprint(metrics_bp)
 
     #HTML Routes
     app.register_blueprint(pages_bp)
@@ -0,0 +1,106 @@
+"""
+Full-text search over data entries backed by an SQLite FTS5 index.
+
+data_entries_fts is an external-content FTS5 table over uid, data_set, data_type,
+device_type and data_going_to, with prefix indexes so `term*` queries are answered
+from the index. Its content table is the decoded data_entry_values view, since
+data_entries stores dictionary ids (app/dictionary.py). Triggers keep it in sync
+with data_entries inside the writing transaction; rebuild_search_index()
+repopulates it from scratch.
+"""
+import re
+
+from sqlalchemy import column, event, table, text
+from app.models.models import DataEntry
+from app.database import db
+from app.dictionary import DICTIONARY_COLUMNS, DICTIONARY_VIEW_DDL
+from app.serializers import data_entries_select
+
+SEARCH_COLUMNS = ['uid', 'data_set', 'data_type', 'device_type', 'data_going_to']
+
+
+def _row_values(row):
+    """Decoded column values of NEW/OLD inside a trigger"""
+    return ', '.join(
+        f'(SELECT value FROM {DICTIONARY_COLUMNS[name].__tablename__} WHERE id = {row}.{name}_id)'
+        if name in DICTIONARY_COLUMNS else f'{row}.{name}'
+        for name in SEARCH_COLUMNS
+    )
+
+
+_columns = ', '.join(SEARCH_COLUMNS)
+_stored_columns = ', '.join(f'{name}_id' if name in DICTIONARY_COLUMNS else name for name in SEARCH_COLUMNS)
+_new_values = _row_values('NEW')
+_old_values = _row_values('OLD')
+
+SEARCH_INDEX_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS data_entries_fts USING fts5("
+    f"{_columns}, content='data_entry_values', content_rowid='id', prefix='2 3 4')"
+)
+
+SEARCH_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_search_insert AFTER INSERT ON data_entries
+BEGIN
+    INSERT INTO data_entries_fts (rowid, {_columns}) VALUES (NEW.id, {_new_values});
+END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_search_delete AFTER DELETE ON data_entries
+BEGIN
+    INSERT INTO data_entries_fts (data_entries_fts, rowid, {_columns}) VALUES ('delete', OLD.id, {_old_values});
+END''',
+    f'''CREATE TRIGGER IF NOT EXISTS trg_search_update AFTER UPDATE OF {_stored_columns} ON data_entries
+BEGIN
+    INSERT INTO data_entries_fts (data_entries_fts, rowid, {_columns}) VALUES ('delete', OLD.id, {_old_values});
+    INSERT INTO data_entries_fts (rowid, {_columns}) VALUES (NEW.id, {_new_values});
+END''',
+]
+
+fts_table = table('data_entries_fts', column('rowid'), column('rank'))
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_search_index(target, connection, **kw):
+    connection.exec_driver_sql(SEARCH_INDEX_DDL)
+    for trigger_sql in SEARCH_TRIGGERS:
+        connection.exec_driver_sql(trigger_sql)
+
+
+def rebuild_search_index():
+    """Create the FTS table and triggers if missing and reindex every data entry"""
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql(DICTIONARY_VIEW_DDL)
+        connection.exec_driver_sql(SEARCH_INDEX_DDL)
+        for trigger_sql in SEARCH_TRIGGERS:
+            connection.exec_driver_sql(trigger_sql)
+        connection.exec_driver_sql("INSERT INTO data_entries_fts (data_entries_fts) VALUES ('rebuild')")
+
+
+def build_match_expression(query, field=None, prefix=True):
+    """
+    Turn user input into a safe FTS5 expression. Each whitespace-separated word
+    becomes a quoted phrase of its tokens (so `xyz_sensor` matches "xyz sensor"),
+    optionally as a prefix query; all words must match.
+    """
+    phrases = []
+    for word in query.split():
+        tokens = re.findall(r'\w+', word)
+        if tokens:
+            phrases.append('"{}"{}'.format(' '.join(tokens), '*' if prefix else ''))
+    if not phrases:
+        return None
+
+    expression = ' AND '.join(phrases)
+    if field:
+        expression = f'{field} : ({expression})'
+    return expression
+
+
+def search_select(expression, limit, offset):
+    """SELECT of a ranked (bm25) page of entries matching an FTS5 expression"""
+    return (
+        data_entries_select()
+        .join(fts_table, fts_table.c.rowid == DataEntry.id)
+        .where(text('data_entries_fts MATCH :expression').bindparams(expression=expression))
+        .order_by(fts_table.c.rank)
+        .limit(limit)
+        .offset(offset)
+    )
@@ -0,0 +1,183 @@
+"""
+List serializers built on column-projected Core queries.
+
+Rows are read straight into dicts with the same shape as Company.to_dict and
+DataEntry.to_dict, without hydrating ORM objects or lazy-loading relationships,
+so a listing costs one query regardless of its size.
+
+?fields= narrows the SELECT itself to the requested columns (and skips the joins
+they do not need). ?format=columnar sends one array per column instead of one
+object per row, so key names are not repeated on every row. In that format
+company_name and the dictionary columns are selected as the integer ids data_entries
+already stores, and sent with one {id: value} dictionary per field covering the
+ids in the response.
+"""
+from sqlalchemy import String, func, select, type_coerce
+from app.models.models import Company, DataEntry
+from app.database import db
+from app.dictionary import DICTIONARY_COLUMNS, join_dictionaries, lookup_value, value_column, value_id_subquery
+from app.metrics import record_rows
+
+
+def _isoformat(column):
+    # SQLite stores DateTime as 'YYYY-MM-DD HH:MM:SS[.ffffff]'; swap the separator in SQL
+    # instead of parsing a datetime per row in Python
+    return func.replace(type_coerce(column, String), ' ', 'T')
+
+
+ENTRY_COLUMNS = (
+    DataEntry.id,
+    DataEntry.company_id,
+    Company.name.label('company_name'),
+    value_column('device_type'),
+    DataEntry.uid,
+    value_column('data_type'),
+    value_column('data_set'),
+    value_column('data_going_to'),
+    _isoformat(DataEntry.created_at).label('created_at'),
+)
+
+COMPANY_COLUMNS = (
+    Company.id,
+    Company.name,
+    _isoformat(Company.created_at).label('created_at'),
+)
+
+ENTRY_FIELDS = [column.key for column in ENTRY_COLUMNS]
+COMPANY_FIELDS = [column.key for column in COMPANY_COLUMNS]
+
+RESPONSE_FORMATS = ['rows', 'columnar']
+# Fields the columnar format sends as ids: field -> id column
+COLUMNAR_CODES = {
+    'company_name': DataEntry.company_id,
+    **{column: getattr(DataEntry, f'{column}_id') for column in DICTIONARY_COLUMNS},
+}
+
+
+def parse_fields(raw_fields, available):
+    """'id,uid' -> ['id', 'uid']; None (every field) when the parameter is absent"""
+    if raw_fields is None:
+        return None
+    fields = list(dict.fromkeys(field.strip() for field in raw_fields.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in available]
+    if not fields or unknown:
+        raise ValueError(f"fields must be a comma-separated list out of {', '.join(available)}")
+    return fields
+
+
+def _project(columns, fields):
+    by_key = {column.key: column for column in columns}
+    return [by_key[field] for field in fields] if fields else list(columns)
+
+
+def data_entries_select(fields=None, codes=False):
+    """
+    SELECT of the DataEntry.to_dict fields (all, or `fields`) with the company name and
+    dictionary values joined in, or with codes=True selected as their ids instead
+    """
+    columns = _project(ENTRY_COLUMNS, fields)
+    if codes:
+        columns = [COLUMNAR_CODES[column.key].label(column.key) if column.key in COLUMNAR_CODES else column
+                   for column in columns]
+    stmt = select(*columns).join_from(DataEntry, Company, DataEntry.company_id == Company.id)
+    if codes:
+        return stmt
+    return join_dictionaries(stmt, [column for column in DICTIONARY_COLUMNS if not fields or column in fields])
+
+
+def companies_select(fields=None):
+    return select(*_project(COMPANY_COLUMNS, fields))
+
+
+def filter_data_entries(stmt, company_name=None, uid=None, data_set=None, device_type=None):
+    """Apply the optional equality filters shared by listing, streaming and export"""
+    if company_name:
+        stmt = stmt.where(Company.name == company_name)
+    if uid:
+        stmt = stmt.where(DataEntry.uid == uid)
+    if data_set:
+        stmt = stmt.where(DataEntry.data_set_id == value_id_subquery('data_set', data_set))
+    if device_type:
+        stmt = stmt.where(DataEntry.device_type_id == value_id_subquery('device_type', device_type))
+    return stmt
+
+
+def rows_to_dicts(result):
+    keys = list(result.keys())
+    rows = [dict(zip(keys, row)) for row in result]
+    record_rows(len(rows))
+    return rows
+
+
+def fetch_rows(stmt):
+    """(column names, row tuples) of a listing query"""
+    result = db.session.execute(stmt)
+    keys = list(result.keys())
+    rows = result.all()
+    record_rows(len(rows))
+    return keys, rows
+
+
+def iter_dicts(stmt, batch_size):
+    """Yield row dicts from a server-side cursor, batch_size rows at a time"""
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    keys = list(result.keys())
+    for partition in result.partitions():
+        record_rows(len(partition))
+        for row in partition:
+            yield dict(zip(keys, row))
+
+
+def serialize_data_entries(stmt):
+    return rows_to_dicts(db.session.execute(stmt))
+
+
+def serialize_data_entry(entry_id):
+    """Single entry as a dict, or None if it does not exist"""
+    rows = serialize_data_entries(data_entries_select().where(DataEntry.id == entry_id))
+    return rows[0] if rows else None
+
+
+def serialize_companies(fields=None):
+    return rows_to_dicts(db.session.execute(companies_select(fields)))
+
+
+def _code_dictionary(field, codes):
+    ids = {code for code in codes if code is not None}
+    if field == 'company_name':
+        return dict(db.session.execute(select(Company.id, Company.name).where(Company.id.in_(ids))).all())
+    return {value_id: lookup_value(field, value_id) for value_id in ids}
+
+
+def columnar(keys, rows, coded=()):
+    """
+    Row tuples -> {'fields', 'count', 'columns': {field: [values]}, 'dictionaries': {field: {id: value}}}
+    where the `coded` fields hold ids (see data_entries_select(codes=True)).
+    """
+    columns = {key: list(values) for key, values in zip(keys, zip(*rows))} if rows else {key: [] for key in keys}
+    dictionaries = {key: _code_dictionary(key, columns[key]) for key in keys if key in coded}
+    return {'fields': list(keys), 'count': len(rows), 'columns': columns, 'dictionaries': dictionaries}
+
+
+def columnar_lists(payload, lists):
+    """
+    Convert the lists of objects stored under the keys of `lists` ({key: [fields]}), at any
+    depth of a JSON payload, to the columnar layout. Empty lists are converted too, and the
+    fields are the listed ones plus any other key found in an item; missing values are None.
+    """
+    if isinstance(payload, list):
+        return [columnar_lists(item, lists) for item in payload]
+    if not isinstance(payload, dict):
+        return payload
+    converted = {}
+    for key, value in payload.items():
+        if key in lists and isinstance(value, list):
+            items = [columnar_lists(item, lists) for item in value]
+            keys = list(lists[key])
+            for item in items:
+                keys.extend(field for field in item if field not in keys)
+            value = columnar(keys, [tuple(item.get(field) for field in keys) for item in items])
+        else:
+            value = columnar_lists(value, lists)
+        converted[key] = value
+    return converted
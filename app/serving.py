@@ -0,0 +1,55 @@
+"""
+Helpers for running the app under a prefork WSGI server (see gunicorn.conf.py).
+
+The app is created once in the master and forked into workers. SQLite connections
+must never cross a fork, so every worker drops the pooled connections it inherited
+and opens its own. Before a worker accepts traffic it compiles the templates, fills
+its connection pools and primes the response cache. All cross-worker state lives
+in the database: WAL lets every worker read while one writes, table_versions keys
+the response cache and ETags, and import job progress is in import_jobs.
+"""
+import logging
+
+from app.database import db
+from app.import_jobs import reap_stale_import_jobs, shutdown_import_jobs
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_PATHS = ['/companies', '/stats', '/stats/companies?ids=all']
+
+
+def dispose_engines(app):
+    """Forget connections inherited from the parent process without closing them"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def warm_up(app):
+    """Compile templates, open pooled connections, fail orphaned import jobs and prime cached responses"""
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    with app.app_context():
+        for engine in db.engines.values():
+            connections = [engine.connect() for _ in range(engine.pool.size())]
+            for connection in connections:
+                connection.exec_driver_sql('SELECT 1')
+                connection.close()
+        reaped = reap_stale_import_jobs()
+        if reaped:
+            logger.warning('Failed %s import jobs left behind by exited workers', reaped)
+
+    client = app.test_client()
+    for path in WARM_UP_PATHS:
+        response = client.get(path)
+        if response.status_code != 200:
+            logger.warning('Warm-up request to %s returned %s', path, response.status_code)
+
+
+def shutdown(app, timeout=0):
+    """Give in-flight import jobs up to `timeout` seconds to finish, interrupt the rest, then close connections"""
+    with app.app_context():
+        shutdown_import_jobs(timeout)
+        for engine in db.engines.values():
+            engine.dispose()
@@ -0,0 +1,180 @@
+"""
+Slow-query log with automatic EXPLAIN QUERY PLAN capture.
+
+Any statement slower than SLOW_QUERY_THRESHOLD_MS is recorded with its normalized
+SQL (literals and IN/VALUES lists collapsed), the shape of its parameters, its
+duration, the route that issued it and SQLite's query plan. The plan is captured
+once per normalized statement and flagged when it contains a full table scan or
+a temporary B-tree for sorting/grouping.
+
+Entries are aggregated in memory (GET /metrics/slow-queries) and appended as JSON
+lines to SLOW_QUERY_LOG_FILE, which `flask --app app slow-queries` summarizes
+across all processes.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import SLOW_QUERY_LOG_FILE, SLOW_QUERY_THRESHOLD_MS
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUES_ROWS = re.compile(r'(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_sql(statement):
+    sql = _WHITESPACE.sub(' ', statement).strip()
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _VALUES_ROWS.sub(r'\1, ...', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?, ...)', sql)
+    return sql
+
+
+def parameters_shape(parameters, executemany):
+    def shape(params):
+        if isinstance(params, dict):
+            return '{' + ', '.join(f'{key}: {type(value).__name__}' for key, value in params.items()) + '}'
+        if isinstance(params, (list, tuple)):
+            if len(params) > 8:
+                return f'({len(params)} params)'
+            return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+        return type(params).__name__
+
+    if executemany:
+        return f'executemany x{len(parameters)} {shape(parameters[0]) if parameters else "()"}'
+    return shape(parameters)
+
+
+def is_full_scan(plan):
+    for _, detail in plan:
+        if detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE' not in detail:
+            return True
+    return False
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statements = {}   # normalized sql -> aggregate
+        self._plans = {}        # normalized sql -> [(id, detail)]
+
+    def plan_for(self, normalized):
+        with self._lock:
+            return self._plans.get(normalized)
+
+    def record(self, entry):
+        with self._lock:
+            self._plans.setdefault(entry['sql'], entry['plan'])
+            stats = self._statements.setdefault(entry['sql'], {
+                'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'routes': set(), 'params_shape': entry['params_shape'],
+                'plan': entry['plan'], 'full_scan': entry['full_scan'], 'temp_btree': entry['temp_btree'],
+            })
+            stats['count'] += 1
+            stats['total_ms'] += entry['duration_ms']
+            stats['max_ms'] = max(stats['max_ms'], entry['duration_ms'])
+            stats['routes'].add(entry['route'])
+
+    def summary(self, limit=20):
+        with self._lock:
+            statements = [dict(stats, routes=sorted(stats['routes'])) for stats in self._statements.values()]
+        return rank_statements(statements, limit)
+
+
+def rank_statements(statements, limit=20):
+    """Order aggregated statements by total time, slowest first"""
+    ranked = sorted(statements, key=lambda stats: stats['total_ms'], reverse=True)[:limit]
+    for stats in ranked:
+        stats['total_ms'] = round(stats['total_ms'], 3)
+        stats['max_ms'] = round(stats['max_ms'], 3)
+        stats['mean_ms'] = round(stats['total_ms'] / stats['count'], 3)
+    return ranked
+
+
+slow_query_log = SlowQueryLog()
+
+
+def _explain(cursor, statement, parameters, executemany):
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return []
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [(row[0], row[3]) for row in explain_cursor.fetchall()]
+    except Exception as e:
+        return [(0, f'EXPLAIN failed: {e}')]
+    finally:
+        explain_cursor.close()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['slow_query_start'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _check_duration(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info.get('slow_query_start', time.perf_counter())) * 1000
+    if duration_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+
+    normalized = normalize_sql(statement)
+    plan = slow_query_log.plan_for(normalized)
+    if plan is None:
+        plan = _explain(cursor, statement, parameters, executemany)
+
+    entry = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'sql': normalized,
+        'params_shape': parameters_shape(parameters, executemany),
+        'duration_ms': round(duration_ms, 3),
+        'route': (f'{request.method} {request.url_rule.rule if request.url_rule else request.path}'
+                  if has_request_context() else 'background'),
+        'plan': plan,
+        'full_scan': is_full_scan(plan),
+        'temp_btree': any('TEMP B-TREE' in detail for _, detail in plan),
+    }
+    slow_query_log.record(entry)
+    logger.warning('Slow query (%.1f ms) on %s: %s', duration_ms, entry['route'], normalized)
+
+    if SLOW_QUERY_LOG_FILE:
+        try:
+            with open(SLOW_QUERY_LOG_FILE, 'a') as log_file:
+                log_file.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            logger.error('Could not write slow query log: %s', e)
+
+
+def summarize_log_file(path=SLOW_QUERY_LOG_FILE, limit=20):
+    """Aggregate the JSON-lines log written by every process"""
+    statements = {}
+    with open(path) as log_file:
+        for line in log_file:
+            entry = json.loads(line)
+            stats = statements.setdefault(entry['sql'], {
+                'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'routes': set(),
+                'params_shape': entry['params_shape'], 'plan': entry['plan'],
+                'full_scan': entry['full_scan'], 'temp_btree': entry['temp_btree'],
+            })
+            stats['count'] += 1
+            stats['total_ms'] += entry['duration_ms']
+            stats['max_ms'] = max(stats['max_ms'], entry['duration_ms'])
+            stats['routes'].add(entry['route'])
+    for stats in statements.values():
+        stats['routes'] = sorted(stats['routes'])
+    return rank_statements(list(statements.values()), limit)
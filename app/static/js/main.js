@@ -18,21 +18,38 @@ function showMessage(elementId, message, type = 'success') {
     }, 5000);
 }
 
+// Last response body and ETag per GET endpoint, used for conditional requests
+const etagCache = new Map();
+
 async function apiRequest(endpoint, options = {}) {
     try {
+        const method = (options.method || 'GET').toUpperCase();
+        const cached = method === 'GET' ? etagCache.get(endpoint) : undefined;
+
         const response = await fetch(`${API_BASE}${endpoint}`, {
+            ...options,
             headers: {
                 'Content-Type': 'application/json',
+                ...(cached ? { 'If-None-Match': cached.etag } : {}),
                 ...options.headers
-            },
-            ...options
+            }
         });
         
+        // Nothing changed on the server since the last fetch
+        if (response.status === 304 && cached) {
+            return cached.data;
+        }
+
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         
-        return await response.json();
+        const data = await response.json();
+        const etag = response.headers.get('ETag');
+        if (method === 'GET' && etag) {
+            etagCache.set(endpoint, { etag, data });
+        }
+        return data;
     } catch (error) {
         console.error('API request failed:', error);
         const responseText = await error.response?.text?.();
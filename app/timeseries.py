@@ -0,0 +1,155 @@
+"""
+Entry counts over time (GET /stats/timeseries).
+
+Counts are read from the hourly and daily rollup tables maintained by the triggers
+in app/rollups.py, so a 90-day daily chart sums a few hundred rollup rows however
+many data entries there are. Weeks (starting on Monday) are folded from the daily
+rows in SQL. All bucket boundaries are UTC.
+
+Empty buckets are filled in with zero counts. With group_by, one series is
+returned per company or data_set; series beyond the top N by total are folded
+into an "other" series, the same way /stats/pivot folds its rows and columns.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import func, null, select
+from app.models.models import Company, EntryDailyCount, EntryHourlyCount
+from app.database import db
+from app.dictionary import lookup_value, value_id_subquery
+from app.pivot import OTHER
+from config import TIMESERIES_DEFAULT_DAYS, TIMESERIES_MAX_BUCKETS
+
+DAY = 86400
+
+# bucket -> (rollup table, bucket size in seconds)
+BUCKETS = {
+    'hour': (EntryHourlyCount, 3600),
+    'day': (EntryDailyCount, DAY),
+    'week': (EntryDailyCount, 7 * DAY),
+}
+GROUP_BY = ['company', 'data_set']
+
+# Accepted times, leaving room to round a range out to whole weeks within datetime's years 1-9999
+TIME_MIN = int(datetime(1, 2, 1, tzinfo=timezone.utc).timestamp())
+TIME_MAX = int(datetime(9999, 12, 1, tzinfo=timezone.utc).timestamp())
+
+
+def parse_time(value):
+    """ISO date/datetime or epoch seconds -> epoch seconds; naive times are UTC. Raises ValueError."""
+    try:
+        seconds = int(float(value))
+    except OverflowError:
+        raise ValueError(f'{value!r} is out of range')
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        seconds = int(parsed.timestamp())
+    if not TIME_MIN <= seconds <= TIME_MAX:
+        raise ValueError(f'{value!r} is out of range')
+    return seconds
+
+
+def format_time(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def _floor(seconds, bucket):
+    if bucket == 'week':
+        # Day 0 of the epoch was a Thursday
+        days = seconds // DAY
+        return (days - (days + 3) % 7) * DAY
+    size = BUCKETS[bucket][1]
+    return seconds // size * size
+
+
+def _bucket_expression(table, bucket):
+    if bucket == 'week':
+        days = table.bucket_start // DAY
+        return (days - (days + 3) % 7) * DAY
+    return table.bucket_start
+
+
+def time_range(bucket, start=None, end=None):
+    """Bucket-aligned [start, end) in epoch seconds; defaults to the last TIMESERIES_DEFAULT_DAYS days"""
+    size = BUCKETS[bucket][1]
+    if end is None:
+        end = int(datetime.now(timezone.utc).timestamp())
+    if start is None:
+        start = end - TIMESERIES_DEFAULT_DAYS * DAY
+    start = _floor(start, bucket)
+    # Round the end up so the bucket containing it is included
+    end = _floor(end - 1, bucket) + size if end > start else start
+    if (end - start) // size > TIMESERIES_MAX_BUCKETS:
+        raise ValueError(f'the range covers more than {TIMESERIES_MAX_BUCKETS} {bucket} buckets')
+    return start, end
+
+
+def timeseries_counts(bucket, start, end, company_id=None, data_set=None, group_by=None):
+    """[(bucket start, group key or None, count)] in one grouped query over the rollup table"""
+    table = BUCKETS[bucket][0]
+    bucket_start = _bucket_expression(table, bucket)
+    group = {'company': table.company_id, 'data_set': table.data_set_id}.get(group_by)
+
+    stmt = select(bucket_start, group if group is not None else null(), func.sum(table.count)).where(
+        table.bucket_start >= start, table.bucket_start < end
+    ).group_by(bucket_start)
+    if group is not None:
+        stmt = stmt.group_by(group)
+    if company_id is not None:
+        stmt = stmt.where(table.company_id == company_id)
+    if data_set is not None:
+        stmt = stmt.where(table.data_set_id == value_id_subquery('data_set', data_set))
+    return db.session.execute(stmt).all()
+
+
+def _points(buckets, counts):
+    return [{'bucket_start': format_time(key), 'count': counts.get(key, 0)} for key in buckets]
+
+
+def _labels(group_by, keys):
+    if group_by == 'company':
+        names = dict(db.session.execute(select(Company.id, Company.name).where(Company.id.in_(list(keys)))).all())
+        return {key: names.get(key) for key in keys}
+    return {key: lookup_value('data_set', key) for key in keys}
+
+
+def build_timeseries(bucket, start, end, company_id=None, data_set=None, group_by=None, top=None):
+    size = BUCKETS[bucket][1]
+    buckets = list(range(start, end, size))
+    rows = timeseries_counts(bucket, start, end, company_id, data_set, group_by)
+
+    result = {
+        'bucket': bucket,
+        'start': format_time(start),
+        'end': format_time(end),
+        'company_id': company_id,
+        'data_set': data_set,
+        'total': sum(count for _, _, count in rows),
+    }
+    if group_by is None:
+        result['points'] = _points(buckets, {key: count for key, _, count in rows})
+        return result
+
+    series_counts, totals = {}, {}
+    for key, group, count in rows:
+        series_counts.setdefault(group, {})[key] = count
+        totals[group] = totals.get(group, 0) + count
+    labels = _labels(group_by, totals)
+    ordered = sorted(totals, key=lambda group: (-totals[group], labels[group] is not None, labels[group] or ''))
+    kept, folded = ordered[:top], ordered[top:]
+
+    series = [
+        {group_by: labels[group], 'total': totals[group], 'points': _points(buckets, series_counts[group])}
+        for group in kept
+    ]
+    if folded:
+        other_counts = {}
+        for group in folded:
+            for key, count in series_counts[group].items():
+                other_counts[key] = other_counts.get(key, 0) + count
+        series.append({group_by: OTHER, 'total': sum(totals[group] for group in folded),
+                       'points': _points(buckets, other_counts)})
+
+    result.update(group_by=group_by, series=series, other_series=len(folded))
+    return result
@@ -0,0 +1,118 @@
+"""
+Cheap per-table change markers and ETag-based conditional GETs.
+
+table_versions holds one counter per tracked table. Triggers bump it on every
+insert, update and delete, so "has anything changed?" is a single primary-key
+lookup. The counters are seeded from the clock so a recreated database never
+reissues the versions of an old one.
+"""
+import hashlib
+from functools import wraps
+
+from flask import Response, g, make_response, request
+from sqlalchemy import event, select
+from app.models.models import TableVersion
+from app.database import db
+
+TRACKED_TABLES = ['companies', 'data_entries']
+
+# Markers bumped only by UPDATE and DELETE, so readers that just append rows past
+# an id watermark (app/analytics.py) can tell when they have to reload instead
+REWRITE_TRACKED_TABLES = ['data_entries']
+
+
+def rewrite_marker(table):
+    return f'{table}_rewrites'
+
+
+VERSION_SEED_SQL = (
+    "INSERT OR IGNORE INTO table_versions (table_name, version) "
+    "VALUES {}".format(', '.join(
+        f"('{name}', CAST(strftime('%s', 'now') AS INTEGER))"
+        for name in TRACKED_TABLES + [rewrite_marker(table) for table in REWRITE_TRACKED_TABLES]
+    ))
+)
+
+VERSION_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{operation.lower()} AFTER {operation} ON {table}
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+END'''
+    for table in TRACKED_TABLES
+    for operation in ('INSERT', 'UPDATE', 'DELETE')
+] + [
+    f'''CREATE TRIGGER IF NOT EXISTS trg_version_{table}_rewrite_{operation.lower()} AFTER {operation} ON {table}
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = '{rewrite_marker(table)}';
+END'''
+    for table in REWRITE_TRACKED_TABLES
+    for operation in ('UPDATE', 'DELETE')
+]
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _install_version_markers(target, connection, **kw):
+    connection.exec_driver_sql(VERSION_SEED_SQL)
+    for trigger_sql in VERSION_TRIGGERS:
+        connection.exec_driver_sql(trigger_sql)
+
+
+def get_table_versions(tables=TRACKED_TABLES):
+    """Return {table_name: version} for the given tables in one query"""
+    rows = db.session.execute(
+        select(TableVersion.table_name, TableVersion.version)
+        .where(TableVersion.table_name.in_(tables))
+    ).all()
+    return dict(rows)
+
+
+def varies_with(key):
+    """
+    Also key the ETag and the response cache of the decorated view on key(), for views
+    whose output depends on more than the tables and the query args. Goes above
+    etag_response and cached_response.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.cache_variant = key()
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_variant():
+    return g.get('cache_variant')
+
+
+def make_etag(versions):
+    """Strong ETag for the current request at the given table versions"""
+    parts = [request.path, *sorted(f'{k}={v}' for k, v in request.args.items(multi=True))]
+    parts += [f'{table}@{versions.get(table)}' for table in sorted(versions)]
+    if cache_variant() is not None:
+        parts.append(f'variant={cache_variant()}')
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+
+def etag_response(*tables):
+    """
+    Answer conditional GETs from the change markers of `tables`. If the client's
+    If-None-Match still matches, return 304 without running the view at all.
+    The comparison is weak, as RFC 9110 specifies for If-None-Match, so the weak
+    ETags of compressed responses (app/compression.py) match too.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = make_etag(get_table_versions(tables))
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
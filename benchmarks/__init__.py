@@ -0,0 +1,7 @@
+"""
+Load and benchmark suite.
+
+    python -m benchmarks.generate --db bench.db --companies 300 --entries 1000000
+    python -m benchmarks.run --db bench.db --clients 8 --requests 200 --output results.json
+    python -m benchmarks.run --db bench.db --compare results.json
+"""
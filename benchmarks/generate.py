@@ -0,0 +1,112 @@
+"""
+Deterministic synthetic data generator.
+
+Builds a database with the app's full schema (rollups, search index and change
+markers included) and fills it with a configurable number of companies and
+entries. device_type, data_set, data_type and data_going_to follow a Zipf-like
+skew, and entries are spread unevenly across companies, like partner data.
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+
+DEVICE_TYPES = ['sensor', 'gateway', 'camera', 'server', 'router', 'thermostat', 'meter',
+                'controller', 'beacon', 'tracker', 'display', 'lock']
+DATA_TYPES = ['temperature', 'humidity', 'network', 'video', 'motion', 'logs', 'power',
+              'location', 'pressure', 'status']
+DESTINATIONS = ['analytics_server', 'monitoring_system', 'security_server', 'log_aggregator',
+                'data_lake', 'billing', 'archive']
+DATA_SET_COUNT = 60
+INSERT_BATCH_SIZE = 10000
+
+
+def zipf_weights(count, exponent=1.1):
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Generator:
+    def __init__(self, seed=42, companies=100, entries=100000):
+        self.random = random.Random(seed)
+        self.company_count = companies
+        self.entry_count = entries
+        self.data_sets = [f'data_set_{index:03d}' for index in range(DATA_SET_COUNT)]
+
+    def company_names(self):
+        return [f'Partner {index:05d}' for index in range(1, self.company_count + 1)]
+
+    def entries(self, company_ids):
+        """Yield entry dicts; uids are unique and prefixed by device type for search"""
+        rng = self.random
+        company_weights = list(itertools.accumulate(zipf_weights(len(company_ids), 0.8)))
+        device_weights = list(itertools.accumulate(zipf_weights(len(DEVICE_TYPES))))
+        data_set_weights = list(itertools.accumulate(zipf_weights(len(self.data_sets))))
+        data_type_weights = list(itertools.accumulate(zipf_weights(len(DATA_TYPES))))
+        destination_weights = list(itertools.accumulate(zipf_weights(len(DESTINATIONS))))
+
+        for index in range(self.entry_count):
+            device_type = rng.choices(DEVICE_TYPES, cum_weights=device_weights)[0]
+            yield {
+                'company_id': rng.choices(company_ids, cum_weights=company_weights)[0],
+                'device_type': device_type,
+                'uid': f'{device_type}_{index:09d}',
+                'data_type': rng.choices(DATA_TYPES, cum_weights=data_type_weights)[0],
+                'data_set': rng.choices(self.data_sets, cum_weights=data_set_weights)[0],
+                'data_going_to': rng.choices(DESTINATIONS, cum_weights=destination_weights)[0],
+            }
+
+
+def build_database(db_path, companies, entries, seed=42, overwrite=False):
+    from app import create_app
+    from app.database import db
+    from app.bulk_import import batches
+    from app.dictionary import encode_entries
+    from app.models.models import Company, DataEntry
+
+    if os.path.exists(db_path):
+        if not overwrite:
+            raise SystemExit(f'{db_path} already exists (use --overwrite)')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    generator = Generator(seed=seed, companies=companies, entries=entries)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(db_path)}'})
+    started = time.perf_counter()
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Company), [{'name': name} for name in generator.company_names()])
+        db.session.commit()
+        company_ids = [company_id for (company_id,) in db.session.query(Company.id).order_by(Company.id)]
+
+        written = 0
+        for batch in batches(generator.entries(company_ids), INSERT_BATCH_SIZE):
+            db.session.execute(insert(DataEntry), encode_entries(batch))
+            db.session.commit()
+            written += len(batch)
+            print(f'\r{written}/{entries} entries', end='', flush=True)
+
+    elapsed = time.perf_counter() - started
+    print(f'\nBuilt {db_path}: {companies} companies, {entries} entries in {elapsed:.1f}s')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic benchmark database')
+    parser.add_argument('--db', default='bench.db', help='SQLite file to create')
+    parser.add_argument('--companies', type=int, default=100)
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args(argv)
+    build_database(args.db, args.companies, args.entries, seed=args.seed, overwrite=args.overwrite)
+
+
+if __name__ == '__main__':
+    main()
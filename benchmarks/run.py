@@ -0,0 +1,245 @@
+"""
+Benchmark harness.
+
+Drives every endpoint through the Flask test client (default) or a running server
+(--url) with concurrent clients, and reports throughput and p50/p95/p99 latency
+per scenario as JSON that can be compared between runs with --compare.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+UPLOAD_ROWS = 500
+
+
+def load_sample(db_path, size=1000):
+    """Values the scenarios draw their parameters from"""
+    connection = sqlite3.connect(db_path)
+    try:
+        companies = connection.execute(
+            'SELECT id, name FROM companies ORDER BY id LIMIT ?', (size,)).fetchall()
+        uids = [uid for (uid,) in connection.execute(
+            'SELECT uid FROM data_entries WHERE id % 97 = 0 LIMIT ?', (size,))]
+        data_sets = [value for (value,) in connection.execute(
+            'SELECT value FROM data_sets')]
+        max_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM data_entries').fetchone()[0]
+        entry_count = connection.execute('SELECT COUNT(*) FROM data_entries').fetchone()[0]
+    finally:
+        connection.close()
+    return {
+        'companies': companies,
+        'uids': uids or ['missing'],
+        'data_sets': data_sets or ['missing'],
+        'max_id': max_id,
+        'entry_count': entry_count,
+    }
+
+
+def _upload_request(rng, sample):
+    run_id = uuid.uuid4().hex[:12]
+    lines = ['company,device_type,uid,data_type,data_set,data_going_to']
+    for index in range(UPLOAD_ROWS):
+        _, company = rng.choice(sample['companies'])
+        company = company.replace('"', '""')
+        lines.append(f'"{company}",sensor,bench_{run_id}_{index},temperature,'
+                     f'{rng.choice(sample["data_sets"])},analytics_server')
+    return 'POST', '/data-entries/upload-csv', {'csv': '\n'.join(lines).encode()}
+
+
+# name -> function(rng, sample) returning (method, path, extra)
+SCENARIOS = {
+    'companies': lambda rng, s: ('GET', '/companies', {}),
+    'data_entries_page': lambda rng, s: (
+        'GET', f'/data-entries?limit=100&after_id={rng.randint(0, max(s["max_id"] - 100, 0))}', {}),
+    'data_entries_by_company': lambda rng, s: (
+        'GET', f'/data-entries?limit=100&after_id=0&company_name={rng.choice(s["companies"])[1]}', {}),
+    'data_entries_by_uid': lambda rng, s: ('GET', f'/data-entries?uid={rng.choice(s["uids"])}', {}),
+    'data_entries_by_data_set': lambda rng, s: (
+        'GET', f'/data-entries?limit=100&after_id=0&data_set={rng.choice(s["data_sets"])}', {}),
+    'data_entry': lambda rng, s: ('GET', f'/data-entries/{rng.randint(1, max(s["max_id"], 1))}', {}),
+    'search': lambda rng, s: ('GET', f'/data-entries/search?q={rng.choice(s["uids"])[:8]}', {}),
+    'stats': lambda rng, s: ('GET', '/stats', {}),
+    'stats_company': lambda rng, s: ('GET', f'/stats/company/{rng.choice(s["companies"])[0]}', {}),
+    'stats_companies': lambda rng, s: ('GET', '/stats/companies?ids=all', {}),
+    'data_set_count': lambda rng, s: (
+        'GET', f'/stats/data-set-count?company_name={rng.choice(s["companies"])[1]}'
+               f'&data_set={rng.choice(s["data_sets"])}', {}),
+    'csv_upload': _upload_request,
+}
+
+
+class TestClientTarget:
+    """In-process target: one Flask test client per benchmark thread"""
+
+    def __init__(self, db_path):
+        from app import create_app
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(db_path)}'})
+        self._local = threading.local()
+
+    def request(self, method, path, extra):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        if 'csv' in extra:
+            response = client.post(path, data={'csv_file': (io.BytesIO(extra['csv']), 'bench.csv')})
+        else:
+            response = client.open(path, method=method)
+        response.get_data()
+        return response.status_code
+
+
+class HttpTarget:
+    """Out-of-process target: a server already running at base_url"""
+
+    def __init__(self, base_url):
+        import requests
+        self._requests = requests
+        self.base_url = base_url.rstrip('/')
+        self._local = threading.local()
+
+    def request(self, method, path, extra):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        if 'csv' in extra:
+            response = session.post(self.base_url + path, files={'csv_file': ('bench.csv', extra['csv'])})
+        else:
+            response = session.request(method, self.base_url + path)
+        return response.status_code
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_scenario(target, name, sample, clients, requests_per_client, warmup, seed):
+    build = SCENARIOS[name]
+    warm_rng = random.Random(seed)
+    for _ in range(warmup):
+        target.request(*build(warm_rng, sample))
+
+    def worker(client_index):
+        rng = random.Random(seed * 1000 + client_index)
+        latencies = []
+        errors = 0
+        for _ in range(requests_per_client):
+            method, path, extra = build(rng, sample)
+            started = time.perf_counter()
+            status = target.request(method, path, extra)
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        outcomes = list(pool.map(worker, range(clients)))
+    duration = time.perf_counter() - started
+
+    latencies = sorted(latency for client_latencies, _ in outcomes for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in outcomes)
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'duration_seconds': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 2) if duration else None,
+        'latency_ms': {
+            'mean': to_ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': to_ms(percentile(latencies, 0.50)),
+            'p95': to_ms(percentile(latencies, 0.95)),
+            'p99': to_ms(percentile(latencies, 0.99)),
+            'max': to_ms(latencies[-1] if latencies else None),
+        },
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """Print throughput and p95 changes against a previous results file"""
+    print(f"\n{'scenario':<26}{'rps':>10}{'base rps':>10}{'change':>9}{'p95 ms':>10}{'base p95':>10}")
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        rps, base_rps = result['throughput_rps'], base['throughput_rps']
+        change = f'{(rps / base_rps - 1) * 100:+.1f}%' if rps and base_rps else 'n/a'
+        print(f"{name:<26}{rps:>10}{base_rps:>10}{change:>9}"
+              f"{result['latency_ms']['p95']:>10}{base['latency_ms']['p95']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the API endpoints')
+    parser.add_argument('--db', default='bench.db', help='Database built by benchmarks.generate')
+    parser.add_argument('--url', help='Benchmark a running server instead of the test client')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per client per scenario')
+    parser.add_argument('--warmup', type=int, default=5, help='Warmup requests per scenario')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Run only these scenarios (repeatable)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Previous results JSON to compare against')
+    args = parser.parse_args(argv)
+
+    sample = load_sample(args.db)
+    target = HttpTarget(args.url) if args.url else TestClientTarget(args.db)
+    scenarios = args.scenario or list(SCENARIOS)
+
+    results = {}
+    for name in scenarios:
+        results[name] = run_scenario(target, name, sample, args.clients, args.requests,
+                                     args.warmup, args.seed)
+        latency = results[name]['latency_ms']
+        print(f"{name:<26}{results[name]['throughput_rps']:>10} req/s  "
+              f"p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  "
+              f"errors {results[name]['errors']}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'target': args.url or 'test_client',
+            'clients': args.clients,
+            'requests_per_client': args.requests,
+            'entries': sample['entry_count'],
+            'companies': len(sample['companies']),
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(report, json.load(baseline))
+
+
+if __name__ == '__main__':
+    main()
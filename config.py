@@ -1,7 +1,121 @@
 import os
+import tempfile
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-SQLALCHEMY_DATABASE_PATH = os.path.join(basedir, "app.db")
+SQLALCHEMY_DATABASE_PATH = os.environ.get("DATABASE_PATH", os.path.join(basedir, "app.db"))
 SQLALCHEMY_DATABASE_URI = f'sqlite:///{SQLALCHEMY_DATABASE_PATH}'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Bulk import
+BULK_IMPORT_BATCH_SIZE = 5000
+BULK_LOOKUP_CHUNK_SIZE = 500
+
+# Dictionary-encoded data_entries columns (app/dictionary.py)
+DICTIONARY_MIGRATION_BATCH_SIZE = 20000
+
+# Excel/CSV ingest pipeline (app/ingest.py)
+INGEST_CHUNK_SIZE = 10000
+
+# GET /data-entries pagination and streaming
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 1000
+
+# JSON encoding of API responses (app/json_provider.py): 'auto' uses orjson when it is
+# installed, 'orjson' requires it, 'stdlib' keeps Flask's default provider
+JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+
+# Response compression (app/compression.py); brotli is used when the package is installed
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 4
+COMPRESSION_STREAM_FLUSH_SIZE = 64 * 1024
+COMPRESSIBLE_MIMETYPES = [
+    'text/', 'application/json', 'application/x-ndjson', 'application/javascript',
+    'application/xml', 'image/svg+xml',
+]
+
+# Fingerprinted static assets (app/assets.py) are served with this max-age and `immutable`
+STATIC_HASHED_MAX_AGE = 365 * 24 * 3600
+# `build-assets --prune` keeps files of earlier builds this long, for pages that still link them
+STATIC_ASSET_RETENTION = 7 * 24 * 3600
+
+# Response cache for /companies and /stats (app/cache.py)
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MAX_ENTRIES = 512
+RESPONSE_CACHE_TTL = 300
+
+# Rendered page cache for /pages/* (keyed on the asset build, so the TTL is only a backstop)
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_MAX_ENTRIES = 64
+PAGE_CACHE_TTL = 3600
+
+# SQLite storage profiles, applied as PRAGMAs on every new connection (app/database.py)
+SQLITE_PROFILES = {
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,        # negative = KiB, i.e. 64 MB page cache per connection
+        'mmap_size': 268435456,      # 256 MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,        # ms
+        'foreign_keys': 'ON',
+    },
+    'safe': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -16384,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+        'busy_timeout': 5000,
+        'foreign_keys': 'ON',
+    },
+}
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'performance')
+SQLITE_READ_POOL_SIZE = 8       # 0 sends reads through the writer connection
+SQLITE_WRITE_POOL_TIMEOUT = 30  # seconds a writer waits for the single write connection
+
+# Batch write API (POST/PUT/DELETE /data-entries/batch)
+MAX_WRITE_BATCH_SIZE = 10000
+
+# Background CSV import jobs (app/import_jobs.py)
+MAX_CONCURRENT_IMPORT_JOBS = 2
+IMPORT_JOB_MAX_ERRORS = 1000
+# Active jobs whose process is gone, or that have not committed a batch for this long, are failed
+IMPORT_JOB_STALE_SECONDS = 600
+IMPORT_SPOOL_DIR = os.path.join(tempfile.gettempdir(), 'flask_app_import_spool')
+
+# Data entry export (app/export.py)
+EXPORT_BATCH_SIZE = 5000
+
+# Request metrics (app/metrics.py)
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING', '0') == '1'
+
+# Analytics engine for /stats: 'sql' reads the rollup tables, 'numpy' answers from an
+# in-memory columnar snapshot of data_entries (app/analytics.py)
+ANALYTICS_ENGINE = os.environ.get('ANALYTICS_ENGINE', 'sql')
+ANALYTICS_LOAD_BATCH_SIZE = 100000
+
+# /stats/pivot: rows and columns beyond the top N are folded into an "other" bucket
+PIVOT_DEFAULT_TOP = 20
+PIVOT_MAX_TOP = 200
+
+# /stats/timeseries (app/timeseries.py): default range, and limits on the points and series returned
+TIMESERIES_DEFAULT_DAYS = 30
+TIMESERIES_MAX_BUCKETS = 5000
+TIMESERIES_DEFAULT_TOP = 10
+
+# Slow-query log (app/slow_queries.py)
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE', os.path.join(basedir, 'slow_queries.jsonl'))
+
+# Production serving (gunicorn.conf.py)
+WEB_BIND = os.environ.get('WEB_BIND', '0.0.0.0:8000')
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', (os.cpu_count() or 1) * 2 + 1))
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 1))
+WEB_MAX_REQUESTS = int(os.environ.get('WEB_MAX_REQUESTS', 2000))
+WEB_MAX_REQUESTS_JITTER = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 200))
+WEB_TIMEOUT = int(os.environ.get('WEB_TIMEOUT', 60))
+WEB_GRACEFUL_TIMEOUT = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
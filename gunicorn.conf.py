@@ -0,0 +1,58 @@
+"""
+Gunicorn settings for production serving: gunicorn -c gunicorn.conf.py wsgi:app
+
+SIGHUP reloads the configuration and replaces workers gracefully, SIGTERM lets
+in-flight requests finish (up to graceful_timeout) before exiting.
+
+Background import jobs run in the worker that accepted the upload. A worker is
+not recycled for max_requests while it runs one, and a worker that is recycled
+anyway gives its jobs up to graceful_timeout to finish. Only a signalled
+shutdown interrupts them straight away, at their next batch boundary.
+"""
+from config import (
+    WEB_BIND, WEB_GRACEFUL_TIMEOUT, WEB_MAX_REQUESTS, WEB_MAX_REQUESTS_JITTER,
+    WEB_THREADS, WEB_TIMEOUT, WEB_WORKERS
+)
+
+bind = WEB_BIND
+workers = WEB_WORKERS
+threads = WEB_THREADS
+worker_class = 'gthread' if WEB_THREADS > 1 else 'sync'
+
+# Recycle workers to cap memory growth; jitter keeps them from restarting together
+max_requests = WEB_MAX_REQUESTS
+max_requests_jitter = WEB_MAX_REQUESTS_JITTER
+
+timeout = WEB_TIMEOUT
+graceful_timeout = WEB_GRACEFUL_TIMEOUT
+keepalive = 5
+
+# Import the app once in the master so workers share its memory copy-on-write
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    from app.serving import dispose_engines
+    dispose_engines(worker.app.wsgi())
+
+
+def post_worker_init(worker):
+    from app.serving import warm_up
+    warm_up(worker.app.wsgi())
+    worker.log.info('Worker %s warmed up', worker.pid)
+
+
+def pre_request(worker, req):
+    # Defer max_requests recycling while this worker has import jobs in flight
+    from app.import_jobs import running_job_count
+    if worker.nr + 1 >= worker.max_requests and running_job_count():
+        worker.max_requests = worker.nr + 2
+
+
+def worker_exit(server, worker):
+    from app.serving import shutdown
+    recycled = worker.nr >= worker.max_requests
+    shutdown(worker.app.wsgi(), timeout=WEB_GRACEFUL_TIMEOUT if recycled else 0)
@@ -35,33 +35,141 @@ def create_database_with_schema():
         )
         ''')
         
+        # Create dictionary tables for the low-cardinality columns (see app/dictionary.py)
+        for dictionary_table in ('device_types', 'data_types', 'data_sets', 'data_destinations'):
+            cursor.execute(f'''
+            CREATE TABLE {dictionary_table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                value TEXT UNIQUE NOT NULL
+            )
+            ''')
+
         # Create data_entries table
         cursor.execute('''
         CREATE TABLE data_entries (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             company_id INTEGER NOT NULL,
-            device_type TEXT,
+            device_type_id INTEGER REFERENCES device_types(id),
             uid TEXT NOT NULL UNIQUE,
-            data_type TEXT,
-            data_set TEXT,
-            data_going_to TEXT,
+            data_type_id INTEGER REFERENCES data_types(id),
+            data_set_id INTEGER REFERENCES data_sets(id),
+            data_going_to_id INTEGER REFERENCES data_destinations(id),
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
         )
         ''')
         
+        # Create rollup tables used by the /stats endpoints (see app/rollups.py)
+        cursor.execute('''
+        CREATE TABLE company_data_set_counts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER NOT NULL,
+            data_set_id INTEGER REFERENCES data_sets(id),
+            count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        cursor.execute('''
+        CREATE TABLE company_device_type_counts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER NOT NULL,
+            device_type_id INTEGER REFERENCES device_types(id),
+            count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # Create the hourly/daily rollups used by /stats/timeseries (see app/rollups.py)
+        cursor.execute('''
+        CREATE TABLE entry_hourly_counts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER NOT NULL,
+            data_set_id INTEGER REFERENCES data_sets(id),
+            bucket_start INTEGER,
+            count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        cursor.execute('''
+        CREATE TABLE entry_daily_counts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            company_id INTEGER NOT NULL,
+            data_set_id INTEGER REFERENCES data_sets(id),
+            bucket_start INTEGER,
+            count INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+        )
+        ''')
+
+        # Create per-table change markers used for ETags (see app/versions.py)
+        cursor.execute('''
+        CREATE TABLE table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+
+        # Create background import job tracking table (see app/import_jobs.py)
+        cursor.execute('''
+        CREATE TABLE import_jobs (
+            id TEXT PRIMARY KEY,
+            filename TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            bytes_total INTEGER NOT NULL DEFAULT 0,
+            bytes_read INTEGER NOT NULL DEFAULT 0,
+            rows_processed INTEGER NOT NULL DEFAULT 0,
+            rows_imported INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            errors TEXT,
+            cancel_requested BOOLEAN NOT NULL DEFAULT 0,
+            owner_pid INTEGER,
+            heartbeat_at DATETIME,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME,
+            finished_at DATETIME
+        )
+        ''')
+
         # Create indexes
         indexes = [
             "CREATE INDEX idx_company_id ON data_entries(company_id)",
             "CREATE INDEX idx_uid ON data_entries(uid)",
-            "CREATE INDEX idx_data_set ON data_entries(data_set)",
-            "CREATE INDEX idx_company_data_set ON data_entries(company_id, data_set)",
+            "CREATE INDEX idx_data_set ON data_entries(data_set_id)",
+            "CREATE INDEX idx_company_data_set ON data_entries(company_id, data_set_id)",
             "CREATE INDEX idx_uid_company ON data_entries(uid, company_id)",
-            "CREATE INDEX idx_device_type ON data_entries(device_type)"
+            "CREATE INDEX idx_device_type ON data_entries(device_type_id)",
+            "CREATE INDEX idx_created_at ON data_entries(created_at)",
+            "CREATE INDEX idx_rollup_company_data_set ON company_data_set_counts(company_id, data_set_id)",
+            "CREATE INDEX idx_rollup_company_device_type ON company_device_type_counts(company_id, device_type_id)",
+            "CREATE INDEX idx_hourly_company_data_set_bucket ON entry_hourly_counts(company_id, data_set_id, bucket_start)",
+            "CREATE INDEX idx_hourly_bucket ON entry_hourly_counts(bucket_start)",
+            "CREATE INDEX idx_daily_company_data_set_bucket ON entry_daily_counts(company_id, data_set_id, bucket_start)",
+            "CREATE INDEX idx_daily_bucket ON entry_daily_counts(bucket_start)"
         ]
         
         for index_sql in indexes:
             cursor.execute(index_sql)
+
+        # Triggers that keep the rollup tables in sync with data_entries
+        from app.rollups import ROLLUP_TRIGGERS
+        for trigger_sql in ROLLUP_TRIGGERS:
+            cursor.execute(trigger_sql)
+
+        # Decoded view of data_entries and the full-text search index over it (see app/search.py)
+        from app.dictionary import DICTIONARY_VIEW_DDL
+        from app.search import SEARCH_INDEX_DDL, SEARCH_TRIGGERS
+        cursor.execute(DICTIONARY_VIEW_DDL)
+        cursor.execute(SEARCH_INDEX_DDL)
+        for trigger_sql in SEARCH_TRIGGERS:
+            cursor.execute(trigger_sql)
+
+        # Seed and maintain the change markers
+        from app.versions import VERSION_SEED_SQL, VERSION_TRIGGERS
+        cursor.execute(VERSION_SEED_SQL)
+        for trigger_sql in VERSION_TRIGGERS:
+            cursor.execute(trigger_sql)
         
         conn.commit()
         print("Database created successfully!")
@@ -84,6 +192,12 @@ def create_database_with_schema():
     finally:
         conn.close()
 
+def dictionary_id(cursor, table, value):
+    """Id of a value in one of the dictionary tables, adding it if needed"""
+    cursor.execute(f"INSERT OR IGNORE INTO {table} (value) VALUES (?)", (value,))
+    cursor.execute(f"SELECT id FROM {table} WHERE value = ?", (value,))
+    return cursor.fetchone()[0]
+
 def populate_sample_data():
     """Populate the database with sample data using direct SQL"""
     db_path = os.path.join(os.path.dirname(__file__), 'app.db')
@@ -173,15 +287,15 @@ def populate_sample_data():
             if company_id:
                 cursor.execute('''
                 INSERT INTO data_entries 
-                (company_id, device_type, uid, data_type, data_set, data_going_to)
+                (company_id, device_type_id, uid, data_type_id, data_set_id, data_going_to_id)
                 VALUES (?, ?, ?, ?, ?, ?)
                 ''', (
                     company_id,
-                    entry_data['device_type'],
+                    dictionary_id(cursor, 'device_types', entry_data['device_type']),
                     entry_data['uid'],
-                    entry_data['data_type'],
-                    entry_data['data_set'],
-                    entry_data['data_going_to']
+                    dictionary_id(cursor, 'data_types', entry_data['data_type']),
+                    dictionary_id(cursor, 'data_sets', entry_data['data_set']),
+                    dictionary_id(cursor, 'data_destinations', entry_data['data_going_to'])
                 ))
                 entries_created += 1
         
@@ -5,29 +5,131 @@ CREATE TABLE companies (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Dictionary tables for the low-cardinality data_entries columns (app/dictionary.py)
+CREATE TABLE device_types (id INTEGER PRIMARY KEY AUTOINCREMENT, value TEXT UNIQUE NOT NULL);
+CREATE TABLE data_types (id INTEGER PRIMARY KEY AUTOINCREMENT, value TEXT UNIQUE NOT NULL);
+CREATE TABLE data_sets (id INTEGER PRIMARY KEY AUTOINCREMENT, value TEXT UNIQUE NOT NULL);
+CREATE TABLE data_destinations (id INTEGER PRIMARY KEY AUTOINCREMENT, value TEXT UNIQUE NOT NULL);
+
 CREATE TABLE data_entries (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     company_id INTEGER NOT NULL,
-    device_type TEXT,
+    device_type_id INTEGER REFERENCES device_types(id),
     uid TEXT NOT NULL UNIQUE,
-    data_type TEXT,
-    data_set TEXT,
-    data_going_to TEXT,
+    data_type_id INTEGER REFERENCES data_types(id),
+    data_set_id INTEGER REFERENCES data_sets(id),
+    data_going_to_id INTEGER REFERENCES data_destinations(id),
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
 );
 
+-- Decoded view: the FTS content table and the easiest way to query entries by hand
+CREATE VIEW data_entry_values AS
+SELECT data_entries.id, data_entries.company_id, data_entries.uid,
+       device_type_dict.value AS device_type, data_type_dict.value AS data_type,
+       data_set_dict.value AS data_set, data_going_to_dict.value AS data_going_to,
+       data_entries.created_at
+FROM data_entries
+LEFT JOIN device_types AS device_type_dict ON device_type_dict.id = data_entries.device_type_id
+LEFT JOIN data_types AS data_type_dict ON data_type_dict.id = data_entries.data_type_id
+LEFT JOIN data_sets AS data_set_dict ON data_set_dict.id = data_entries.data_set_id
+LEFT JOIN data_destinations AS data_going_to_dict ON data_going_to_dict.id = data_entries.data_going_to_id;
+
 -- Optimized indexing strategy
 CREATE INDEX idx_company_id ON data_entries(company_id);
 CREATE INDEX idx_uid ON data_entries(uid);
-CREATE INDEX idx_data_set ON data_entries(data_set);
+CREATE INDEX idx_data_set ON data_entries(data_set_id);
 
 -- Composite indexes for common query patterns
-CREATE INDEX idx_company_data_set ON data_entries(company_id, data_set);
+CREATE INDEX idx_company_data_set ON data_entries(company_id, data_set_id);
 CREATE INDEX idx_uid_company ON data_entries(uid, company_id);
 
 -- Optional: If device_type is frequently queried
-CREATE INDEX idx_device_type ON data_entries(device_type);
+CREATE INDEX idx_device_type ON data_entries(device_type_id);
+
+-- Time-range scans for /stats/timeseries and ad-hoc queries
+CREATE INDEX idx_created_at ON data_entries(created_at);
+
+-- Rollup tables for the /stats endpoints, kept in sync by the triggers in app/rollups.py
+CREATE TABLE company_data_set_counts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    data_set_id INTEGER REFERENCES data_sets(id),
+    count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+);
+
+CREATE TABLE company_device_type_counts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    device_type_id INTEGER REFERENCES device_types(id),
+    count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_rollup_company_data_set ON company_data_set_counts(company_id, data_set_id);
+CREATE INDEX idx_rollup_company_device_type ON company_device_type_counts(company_id, device_type_id);
+
+-- Time-bucketed rollups for /stats/timeseries: bucket_start is created_at truncated
+-- to the hour/day in UTC epoch seconds
+CREATE TABLE entry_hourly_counts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    data_set_id INTEGER REFERENCES data_sets(id),
+    bucket_start INTEGER,
+    count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+);
+
+CREATE TABLE entry_daily_counts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    data_set_id INTEGER REFERENCES data_sets(id),
+    bucket_start INTEGER,
+    count INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (company_id) REFERENCES companies(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_hourly_company_data_set_bucket ON entry_hourly_counts(company_id, data_set_id, bucket_start);
+CREATE INDEX idx_hourly_bucket ON entry_hourly_counts(bucket_start);
+CREATE INDEX idx_daily_company_data_set_bucket ON entry_daily_counts(company_id, data_set_id, bucket_start);
+CREATE INDEX idx_daily_bucket ON entry_daily_counts(bucket_start);
+
+-- No triggers here: the rollup triggers (insert, update and delete, for both the count and the
+-- time-bucketed tables), the search index triggers and the table_versions triggers are generated
+-- in app/rollups.py, app/search.py and app/versions.py. After loading this file, run
+-- `flask --app app upgrade-db`, which installs all of them and backfills the rollups.
+
+-- Per-table change markers for ETags, bumped by the triggers in app/versions.py
+CREATE TABLE table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- Full-text search over data entries with prefix indexes; the sync triggers are in app/search.py
+CREATE VIRTUAL TABLE data_entries_fts USING fts5(
+    uid, data_set, data_type, device_type, data_going_to,
+    content='data_entry_values', content_rowid='id', prefix='2 3 4'
+);
+
+-- Background CSV import jobs (app/import_jobs.py)
+CREATE TABLE import_jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    bytes_total INTEGER NOT NULL DEFAULT 0,
+    bytes_read INTEGER NOT NULL DEFAULT 0,
+    rows_processed INTEGER NOT NULL DEFAULT 0,
+    rows_imported INTEGER NOT NULL DEFAULT 0,
+    error_count INTEGER NOT NULL DEFAULT 0,
+    errors TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT 0,
+    owner_pid INTEGER,
+    heartbeat_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME,
+    finished_at DATETIME
+);
 
 -- Optimized queries using JOINs instead of subqueries
 SELECT de.* 
@@ -43,11 +145,11 @@ SELECT COUNT(*)
 FROM data_entries de
 JOIN companies c ON de.company_id = c.id
 WHERE c.name = 'Company XYZ'
-AND de.data_set = 'some_data_set';
+AND de.data_set_id = (SELECT id FROM data_sets WHERE value = 'some_data_set');
 
 -- Alternative direct count if you have company_id
 SELECT COUNT(*) FROM data_entries
-WHERE company_id = ? AND data_set = ?;
+WHERE company_id = ? AND data_set_id = ?;
 
 -- Additional useful queries for common patterns
 SELECT c.name, COUNT(de.id) as entry_count
@@ -55,8 +157,9 @@ FROM companies c
 LEFT JOIN data_entries de ON c.id = de.company_id
 GROUP BY c.id, c.name;
 
-SELECT data_set, COUNT(*) as count
-FROM data_entries
-WHERE company_id = ?
-GROUP BY data_set
+SELECT ds.value AS data_set, COUNT(*) as count
+FROM data_entries de
+LEFT JOIN data_sets ds ON ds.id = de.data_set_id
+WHERE de.company_id = ?
+GROUP BY de.data_set_id
 ORDER BY count DESC;
\ No newline at end of file
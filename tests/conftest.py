@@ -0,0 +1,42 @@
+import os
+import tempfile
+
+import pytest
+
+# config reads these at import time, so set them before anything imports the app
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'app.db'))
+os.environ.setdefault('SLOW_QUERY_LOG_FILE', '')
+
+from app import create_app
+from app import dictionary
+from app.cache import page_cache, response_cache
+from app.database import db
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """A fresh app on its own database. The in-process caches are module-level, so they are reset too."""
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}"})
+    monkeypatch.setattr(dictionary, 'dictionary_cache', dictionary.DictionaryCache())
+    response_cache.bump()
+    page_cache.bump()
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def companies(client):
+    """Companies A and B, with ids 1 and 2"""
+    for name in ('A', 'B'):
+        assert client.post('/companies', json={'name': name}).status_code == 201
+    return {'A': 1, 'B': 2}
@@ -0,0 +1,80 @@
+import pytest
+
+
+def uids(client):
+    return sorted(entry['uid'] for entry in client.get('/data-entries').json)
+
+
+def statuses(response):
+    return [result['status'] for result in response.json['results']]
+
+
+@pytest.fixture
+def entries(client, companies):
+    response = client.post('/data-entries/batch', json=[{'company_id': 1, 'uid': f'u{i}'} for i in range(3)])
+    assert statuses(response) == [201, 201, 201]
+
+
+def test_create_applies_valid_items_and_reports_the_rest(client, entries):
+    response = client.post('/data-entries/batch', json={'entries': [
+        {'company_id': 1, 'uid': 'new1', 'data_set': 'ds1'},
+        {'company_id': 99, 'uid': 'new2'},
+        {'company': 'B', 'uid': 'new3'},
+        {'company_id': 1, 'uid': 'u0'},
+        {'company_id': 1},
+        'not an object',
+    ]})
+    assert response.status_code == 200
+    assert response.json['applied'] is True
+    assert (response.json['succeeded'], response.json['failed']) == (2, 4)
+    assert statuses(response) == [201, 404, 201, 400, 400, 400]
+    assert [result.get('error') for result in response.json['results']] == [
+        None, 'Company not found', None, 'UID already exists', 'uid is required', 'Entry must be an object'
+    ]
+    assert uids(client) == ['new1', 'new3', 'u0', 'u1', 'u2']
+
+
+def test_atomic_create_rolls_back_everything_on_any_error(client, entries):
+    response = client.post('/data-entries/batch?atomic=true', json=[
+        {'company_id': 1, 'uid': 'new1'},
+        {'company_id': 1, 'uid': 'u0'},
+    ])
+    assert response.status_code == 400
+    assert response.json['applied'] is False
+    assert response.json['succeeded'] == 0
+    assert statuses(response) == [424, 400]
+    assert uids(client) == ['u0', 'u1', 'u2']
+
+
+@pytest.mark.parametrize('company_id', [1.5, '1.9', True, 'abc', [1]])
+def test_company_id_must_be_a_whole_number(client, entries, company_id):
+    response = client.post('/data-entries/batch', json=[{'company_id': company_id, 'uid': 'new1'}])
+    assert response.json['results'] == [{'index': 0, 'status': 400, 'error': 'company_id must be an integer'}]
+
+
+def test_company_id_may_be_a_digit_string(client, entries):
+    response = client.post('/data-entries/batch', json=[{'company_id': '2', 'uid': 'new1'}])
+    assert statuses(response) == [201]
+    assert client.get('/data-entries/4').json['company_name'] == 'B'
+
+
+def test_update_and_delete_report_per_item(client, entries):
+    response = client.put('/data-entries/batch', json=[
+        {'id': 1, 'data_set': 'moved'},
+        {'id': 99, 'data_set': 'moved'},
+        {'id': 2, 'data_set': 5},
+    ])
+    assert statuses(response) == [200, 404, 400]
+    assert client.get('/data-entries/1').json['data_set'] == 'moved'
+    assert client.get('/data-entries/2').json['data_set'] is None
+
+    response = client.delete('/data-entries/batch', json={'ids': [2, 99]})
+    assert statuses(response) == [200, 404]
+    assert uids(client) == ['u0', 'u2']
+
+
+def test_atomic_delete_leaves_rows_in_place(client, entries):
+    response = client.delete('/data-entries/batch?atomic=true', json=[1, 2, 99])
+    assert response.status_code == 400
+    assert statuses(response) == [424, 424, 404]
+    assert uids(client) == ['u0', 'u1', 'u2']
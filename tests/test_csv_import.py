@@ -0,0 +1,43 @@
+import io
+
+HEADER = 'company,device_type,uid,data_type,data_set,data_going_to'
+
+
+def upload(client, lines):
+    body = '\n'.join([HEADER] + lines).encode()
+    return client.post('/data-entries/upload-csv', data={'csv_file': (io.BytesIO(body), 'entries.csv')})
+
+
+def test_imports_valid_rows_and_reports_bad_ones(client, companies):
+    response = upload(client, [
+        'A,sensor,u1,temp,ds1,x',
+        'B,gateway,u2,temp,ds2,x',
+        'Nope,sensor,u3,temp,ds1,x',
+        'A,sensor,,temp,ds1,x',
+        'A,sensor,u1,temp,ds1,x',
+    ])
+    assert response.status_code == 200
+    assert response.json['imported'] == 2
+    assert response.json['errors'] == [
+        "Company 'Nope' not found",
+        'uid is required',
+        'UID already exists',
+    ]
+
+    entries = client.get('/data-entries').json
+    assert sorted((entry['uid'], entry['company_name'], entry['data_set']) for entry in entries) == [
+        ('u1', 'A', 'ds1'), ('u2', 'B', 'ds2')
+    ]
+
+
+def test_rejects_uids_already_stored(client, companies):
+    assert client.post('/data-entries', json={'company_id': 1, 'uid': 'u1'}).status_code == 201
+
+    response = upload(client, ['A,sensor,u1,temp,ds1,x', 'A,sensor,u2,temp,ds1,x'])
+    assert response.json['imported'] == 1
+    assert response.json['errors'] == ['UID already exists']
+
+
+def test_rejects_non_csv_file(client):
+    response = client.post('/data-entries/upload-csv', data={'csv_file': (io.BytesIO(b''), 'entries.txt')})
+    assert response.status_code == 400
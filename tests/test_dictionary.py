@@ -0,0 +1,110 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+
+from app import create_app
+from app import dictionary
+from app.cache import response_cache
+from app.database import db
+
+# data_entries as it was before the dictionary columns, with its original index
+LEGACY_SCHEMA = '''
+CREATE TABLE companies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE data_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    company_id INTEGER NOT NULL,
+    device_type TEXT,
+    uid TEXT NOT NULL UNIQUE,
+    data_type TEXT,
+    data_set TEXT,
+    data_going_to TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (company_id) REFERENCES companies (id)
+);
+CREATE INDEX idx_data_set ON data_entries(data_set);
+INSERT INTO companies (name) VALUES ('A'), ('B');
+'''
+
+
+@pytest.fixture
+def legacy_app(tmp_path, monkeypatch):
+    path = tmp_path / 'legacy.db'
+    with sqlite3.connect(path) as connection:
+        connection.executescript(LEGACY_SCHEMA)
+        connection.executemany(
+            'INSERT INTO data_entries (company_id, device_type, uid, data_type, data_set, data_going_to) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(1 + i % 2, f'dev{i % 3}', f'u{i}', 'temp', f'ds{i % 4}' if i % 5 else None, 'x') for i in range(250)]
+        )
+    connection.close()
+    monkeypatch.setattr(dictionary, 'dictionary_cache', dictionary.DictionaryCache())
+    response_cache.bump()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_upgrade_converts_legacy_columns_and_keeps_values(legacy_app):
+    result = legacy_app.test_cli_runner().invoke(args=['upgrade-db', '--batch-size', '100'])
+    assert result.exit_code == 0, result.output
+    assert 'Database upgraded.' in result.output
+
+    with legacy_app.app_context():
+        columns = {row[1] for row in db.session.execute(text('PRAGMA table_info(data_entries)'))}
+        assert dictionary.legacy_columns(db.session.connection()) == []
+        triggers = {row[0] for row in db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))}
+    assert {'device_type_id', 'data_type_id', 'data_set_id', 'data_going_to_id'} <= columns
+    assert not set(dictionary.SYNC_TRIGGERS) & triggers
+
+    client = legacy_app.test_client()
+    entries = {entry['uid']: entry for entry in client.get('/data-entries').json}
+    assert len(entries) == 250
+    assert (entries['u7']['device_type'], entries['u7']['data_set'], entries['u7']['company_name']) == ('dev1', 'ds3', 'B')
+    assert entries['u10']['data_set'] is None
+
+    # The rollups and search index were rebuilt from the converted rows
+    stats = client.get('/stats').json
+    assert {row['data_set']: row['count'] for row in stats['data_set_distribution']}['ds1'] == 50
+    search = client.get('/data-entries/search?q=u249&field=uid&mode=term').json
+    assert [entry['data_set'] for entry in search['data_entries']] == ['ds1']
+
+    assert client.post('/data-entries', json={'company_id': 2, 'uid': 'new', 'data_set': 'ds1'}).status_code == 201
+    assert client.get('/stats/data-set-count?company_name=B&data_set=ds1').json['count'] == 51
+
+
+def test_upgrade_is_a_no_op_on_a_current_database(app):
+    result = app.test_cli_runner().invoke(args=['upgrade-db'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert dictionary.migrate_to_dictionary_storage() == 0
+
+
+def test_values_are_shared_through_the_dictionary(app, client, companies):
+    for uid in ('u1', 'u2'):
+        client.post('/data-entries', json={'company_id': 1, 'uid': uid, 'data_set': 'shared', 'device_type': 'sensor'})
+    client.put('/data-entries/2', json={'data_set': 'other'})
+
+    with app.app_context():
+        values = db.session.execute(text('SELECT value FROM data_sets ORDER BY value')).scalars().all()
+    assert values == ['other', 'shared']
+    assert [entry['data_set'] for entry in client.get('/data-entries').json] == ['shared', 'other']
+
+
+@pytest.mark.parametrize('field', ['data_set', 'device_type', 'data_type', 'data_going_to', 'uid'])
+def test_non_string_values_are_rejected(client, companies, field):
+    response = client.post('/data-entries', json={'company_id': 1, 'uid': 'u1', field: 5})
+    assert response.status_code == 400
+    assert response.json == {'error': f'{field} must be a string'}
+
+    assert client.post('/data-entries', json={'company_id': 1, 'uid': 'u1'}).status_code == 201
+    response = client.put('/data-entries/1', json={field: 5})
+    assert response.status_code == 400
+    assert response.json == {'error': f'{field} must be a string'}
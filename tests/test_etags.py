@@ -0,0 +1,52 @@
+import sqlite3
+
+
+def revalidate(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+def test_unchanged_resource_answers_304(client, companies):
+    first = client.get('/companies')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    response = revalidate(client, '/companies', etag)
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_write_invalidates_etag(client, companies):
+    client.post('/data-entries', json={'company_id': 1, 'uid': 'u1', 'data_set': 'ds1'})
+    urls = ['/companies', '/data-entries', '/data-entries/1', '/stats', '/stats/company/1']
+    etags = {url: client.get(url).headers['ETag'] for url in urls}
+
+    client.post('/data-entries', json={'company_id': 1, 'uid': 'u2'})
+
+    # Entry writes leave /companies alone but change everything built from data_entries
+    assert revalidate(client, '/companies', etags['/companies']).status_code == 304
+    for url in urls[1:]:
+        response = revalidate(client, url, etags[url])
+        assert response.status_code == 200, url
+        assert response.headers['ETag'] != etags[url]
+
+    assert client.post('/companies', json={'name': 'C'}).status_code == 201
+    assert revalidate(client, '/companies', etags['/companies']).status_code == 200
+
+
+def test_write_from_another_connection_invalidates_etag(app, client, companies):
+    etag = client.get('/stats').headers['ETag']
+    assert revalidate(client, '/stats', etag).status_code == 304
+
+    # e.g. another worker process or the ingest CLI, bypassing this process entirely
+    path = app.config['SQLALCHEMY_DATABASE_URI'].removeprefix('sqlite:///')
+    with sqlite3.connect(path) as connection:
+        connection.execute("INSERT INTO data_entries (company_id, uid) VALUES (1, 'outside')")
+
+    response = revalidate(client, '/stats', etag)
+    assert response.status_code == 200
+    assert response.json['total_entries'] == 1
+
+
+def test_etag_differs_per_query(client, companies):
+    assert client.get('/companies').headers['ETag'] != client.get('/companies?fields=id').headers['ETag']
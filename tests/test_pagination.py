@@ -0,0 +1,41 @@
+import pytest
+
+from config import MAX_PAGE_SIZE
+
+
+@pytest.fixture
+def entries(client, companies):
+    for i in range(5):
+        assert client.post('/data-entries', json={'company_id': 1, 'uid': f'u{i}'}).status_code == 201
+
+
+def test_keyset_pages_cover_every_row_once(client, entries):
+    uids = []
+    after_id = 0
+    while after_id is not None:
+        page = client.get(f'/data-entries?limit=2&after_id={after_id}').json
+        assert len(page['data_entries']) <= 2
+        uids += [entry['uid'] for entry in page['data_entries']]
+        after_id = page['next_after_id']
+    assert uids == [f'u{i}' for i in range(5)]
+
+
+def test_unpaginated_request_returns_all_rows(client, entries):
+    assert len(client.get('/data-entries').json) == 5
+
+
+@pytest.mark.parametrize('query, message', [
+    ('limit=abc', 'limit must be an integer'),
+    ('limit=1.5', 'limit must be an integer'),
+    ('after_id=x', 'after_id must be an integer'),
+    ('limit=0', 'limit must be at least 1'),
+    ('limit=-3', 'limit must be at least 1'),
+])
+def test_rejects_invalid_limit_and_after_id(client, entries, query, message):
+    response = client.get(f'/data-entries?{query}')
+    assert response.status_code == 400
+    assert response.json == {'error': message}
+
+
+def test_limit_is_capped(client, entries):
+    assert client.get(f'/data-entries?limit={MAX_PAGE_SIZE + 1}').json['limit'] == MAX_PAGE_SIZE
@@ -0,0 +1,63 @@
+import io
+
+from sqlalchemy import text
+
+from app.database import db
+from app.rollups import ROLLUPS, TIME_ROLLUPS, rebuild_rollups
+
+
+def distributions(client, company_id):
+    stats = client.get(f'/stats/company/{company_id}').json
+    return (
+        stats['total_entries'],
+        {row['data_set']: row['count'] for row in stats['data_set_counts']},
+        {row['device_type']: row['count'] for row in stats['device_type_counts']},
+    )
+
+
+def rollup_rows(app):
+    with app.app_context():
+        return {
+            table: sorted(tuple(row) for row in db.session.execute(
+                text(f"SELECT {', '.join(keys)}, count FROM {table}")
+            ))
+            for table, keys in ROLLUPS + TIME_ROLLUPS
+        }
+
+
+def test_counts_follow_insert_update_and_delete(client, companies):
+    for uid, company_id, data_set, device_type in [
+        ('u1', 1, 'ds1', 'sensor'), ('u2', 1, 'ds1', 'gateway'), ('u3', 1, 'ds2', 'sensor'), ('u4', 2, 'ds1', None)
+    ]:
+        client.post('/data-entries', json={
+            'company_id': company_id, 'uid': uid, 'data_set': data_set, 'device_type': device_type
+        })
+    assert distributions(client, 1) == (3, {'ds1': 2, 'ds2': 1}, {'sensor': 2, 'gateway': 1})
+
+    client.put('/data-entries/1', json={'data_set': 'ds2', 'device_type': 'gateway'})
+    assert distributions(client, 1) == (3, {'ds1': 1, 'ds2': 2}, {'sensor': 1, 'gateway': 2})
+
+    client.delete('/data-entries/2')
+    client.delete('/data-entries/3')
+    # Groups that drop to zero disappear instead of lingering with a count of 0
+    assert distributions(client, 1) == (1, {'ds2': 1}, {'gateway': 1})
+
+    stats = client.get('/stats').json
+    assert stats['total_entries'] == 2
+    assert {row['data_set']: row['count'] for row in stats['data_set_distribution']} == {'ds1': 1, 'ds2': 1}
+    assert client.get('/stats/data-set-count?company_name=B&data_set=ds1').json['count'] == 1
+
+
+def test_bulk_writes_match_a_full_rebuild(app, client, companies):
+    lines = ['company,device_type,uid,data_type,data_set,data_going_to']
+    lines += [f"{'AB'[i % 2]},{'sg'[i % 3 == 0]},u{i},t,ds{i % 4},x" for i in range(50)]
+    client.post('/data-entries/upload-csv',
+                data={'csv_file': (io.BytesIO('\n'.join(lines).encode()), 'entries.csv')})
+    client.put('/data-entries/batch', json=[{'id': 1, 'data_set': 'moved'}, {'id': 2, 'device_type': None}])
+    client.delete('/data-entries/batch', json=[3, 4, 5])
+    client.delete('/companies/2')
+
+    maintained = rollup_rows(app)
+    with app.app_context():
+        rebuild_rollups()
+    assert rollup_rows(app) == maintained
@@ -0,0 +1,13 @@
+"""
+Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+
+from app import create_app
+from app.database import create_database
+from config import SQLALCHEMY_DATABASE_PATH
+
+app = create_app()
+
+if not os.path.exists(SQLALCHEMY_DATABASE_PATH):
+    create_database(app)